@@ -0,0 +1,66 @@
+"""Single-pass DataAggregator vs. the previous one-groupby-per-report implementation.
+
+Usage: python -m benchmarks.bench_aggregator --rows 50000000
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_transactions
+from src.processing.aggregator import DataAggregator
+
+
+def legacy_reports(df: pd.DataFrame):
+    """The four reports as run_pipeline computed them before the single-pass engine"""
+    by_agent = df.groupby("agent_id")["transaction_amount"].sum().reset_index()
+    by_retailer = df.groupby("retailer_id")["transaction_amount"].sum().reset_index()
+    df_copy = df.copy()
+    df_copy["month"] = pd.to_datetime(df_copy["date"]).dt.to_period("M")
+    monthly = df_copy.groupby("month")["transaction_amount"].sum().reset_index()
+    agent_sales = df.groupby("agent_id")["transaction_amount"].sum().reset_index()
+    agent_sales["commission_rate"] = agent_sales["transaction_amount"].apply(lambda x: 0.08 if x >= 5000 else 0.05)
+    return by_agent, by_retailer, monthly, agent_sales
+
+
+def engine_reports(df: pd.DataFrame):
+    aggregator = DataAggregator(df)
+    return (aggregator.sales_by_agent(), aggregator.sales_by_retailer(),
+            aggregator.monthly_totals(), aggregator.calculate_commission())
+
+
+def best_of(fn, df, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--agents", type=int, default=50_000)
+    parser.add_argument("--retailers", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    df = make_transactions(args.rows, args.agents, args.retailers)
+    legacy = best_of(legacy_reports, df, args.repeat)
+    engine = best_of(engine_reports, df, args.repeat)
+
+    results = {"rows": args.rows, "legacy_seconds": round(legacy, 3), "engine_seconds": round(engine, 3),
+               "speedup": round(legacy / engine, 2)}
+    print(f"{args.rows} rows: legacy {results['legacy_seconds']}s, "
+          f"single-pass {results['engine_seconds']}s ({results['speedup']}x)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
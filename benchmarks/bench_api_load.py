@@ -0,0 +1,83 @@
+"""Closed-loop HTTP load test reporting p50/p99 latency per endpoint.
+
+Start the API (python main.py api), then run for example:
+    python -m benchmarks.bench_api_load --url http://localhost:8000 --concurrency 64 --requests 5000
+
+Run it against two builds (e.g. before and after a change) with the same
+arguments and compare the JSON written with --output.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/agents",
+    "/retailers",
+    "/reports/monthly",
+    "/agents/A001/commission",
+    "/retailers/R001/sales",
+]
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+async def worker(client: httpx.AsyncClient, path: str, remaining: list[int], latencies: list[float], errors: list[int]):
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        start = time.perf_counter()
+        response = await client.get(path)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 500:
+            errors[0] += 1
+
+
+async def load_path(url: str, path: str, concurrency: int, requests: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        await client.get(path)  # warm up connections and caches
+        remaining, latencies, errors = [requests], [], [0]
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client, path, remaining, latencies, errors) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+    }
+
+
+async def run(url: str, paths: list[str], concurrency: int, requests: int) -> dict:
+    return {path: await load_path(url, path, concurrency, requests) for path in paths}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per path")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.url, args.paths, args.concurrency, args.requests))
+    print(f"{'path':<28}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for path, r in results.items():
+        print(f"{path:<28}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, "concurrency": args.concurrency, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Time to apply flat and marginal tier plans to many agents' totals at once.
+
+Usage: python -m benchmarks.bench_commission --agents 500000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.processing.commission import CommissionPlan, CommissionRules
+
+TIERS = [
+    {"min_sales": 0, "rate": 0.05},
+    {"min_sales": 5000, "rate": 0.08},
+    {"min_sales": 10000, "rate": 0.10},
+]
+
+
+def apply_seconds(rules: CommissionRules, agent_sales: pd.DataFrame, repeat: int) -> float:
+    """Best of repeat runs of rules.apply"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rules.apply(agent_sales)
+        timings.append(time.perf_counter() - start)
+    return round(min(timings), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    agent_sales = pd.DataFrame({
+        "agent_id": np.arange(args.agents).astype(str),
+        "total_sales": np.random.default_rng(0).uniform(0, 20000, args.agents),
+    })
+
+    results = {"agents": args.agents}
+    for mode in ("flat", "marginal"):
+        rules = CommissionRules([CommissionPlan(mode, TIERS, mode=mode)])
+        results[mode] = {"seconds": apply_seconds(rules, agent_sales, args.repeat)}
+        print(f"{mode:<10}{results[mode]['seconds']:>10}s for {args.agents} agents")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
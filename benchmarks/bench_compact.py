@@ -0,0 +1,62 @@
+"""Memory footprint and aggregation time of the compact ingestion schema.
+
+Usage: python -m benchmarks.bench_compact --rows 10000000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.synthetic import make_transactions
+from src.ingestion.reader import compact
+from src.processing.aggregator import DataAggregator
+
+
+def memory_mb(df) -> dict:
+    usage = df.memory_usage(deep=True, index=False)
+    return {**{column: round(b / 2**20, 1) for column, b in usage.items()}, "total": round(float(usage.sum()) / 2**20, 1)}
+
+
+def aggregate_seconds(df) -> float:
+    start = time.perf_counter()
+    aggregator = DataAggregator(df)
+    aggregator.sales_by_agent()
+    aggregator.sales_by_retailer()
+    aggregator.monthly_totals()
+    aggregator.calculate_commission()
+    return round(time.perf_counter() - start, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--agents", type=int, default=50_000)
+    parser.add_argument("--retailers", type=int, default=200_000)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Validated frame as ingestion produced it before the compact schema
+    validated = make_transactions(args.rows, args.agents, args.retailers)
+    validated["date"] = validated["date"].astype("datetime64[ns]")
+    start = time.perf_counter()
+    compacted = compact(validated)
+    compact_seconds = round(time.perf_counter() - start, 3)
+    frames = {
+        "validated": validated,
+        "compact": compacted,
+        "compact_cents": compact(validated, amounts_in_cents=True),
+    }
+
+    results = {"rows": args.rows, "compact_seconds": compact_seconds}
+    print(f"compacting {args.rows} rows took {compact_seconds}s (paid once at ingestion)")
+    for name, df in frames.items():
+        results[name] = {"memory_mb": memory_mb(df), "aggregate_seconds": aggregate_seconds(df)}
+        print(f"{name:<14} {results[name]['memory_mb']['total']:>10} MB {results[name]['aggregate_seconds']:>8}s  "
+              f"{results[name]['memory_mb']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Scan vs. index latency for the transactions query patterns on a synthetic table.
+
+Usage: python -m benchmarks.bench_indexes --rows 10000000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from src.storage.models import Transaction
+
+QUERIES = {
+    "sum_by_agent": (
+        "SELECT SUM(transaction_amount) FROM transactions WHERE agent_id = :agent_id",
+        {"agent_id": "A00042"},
+    ),
+    "sum_by_retailer": (
+        "SELECT SUM(transaction_amount) FROM transactions WHERE retailer_id = :retailer_id",
+        {"retailer_id": "R004242"},
+    ),
+    "sum_date_range": (
+        "SELECT SUM(transaction_amount) FROM transactions WHERE date BETWEEN :start AND :end",
+        {"start": "2024-03-01", "end": "2024-03-07"},
+    ),
+}
+
+
+def populate(engine, rows: int, agents: int, retailers: int, batch_size: int = 500_000, seed: int = 42):
+    """Fill the transactions table with deterministic synthetic rows using raw executemany"""
+    rng = np.random.default_rng(seed)
+    days = np.datetime64("2024-01-01") + np.arange(366)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for start in range(0, rows, batch_size):
+            n = min(batch_size, rows - start)
+            agent_ids = np.char.add("A", np.char.zfill(rng.integers(0, agents, n).astype(str), 5))
+            retailer_ids = np.char.add("R", np.char.zfill(rng.integers(0, retailers, n).astype(str), 6))
+            amounts = np.round(rng.uniform(1, 5000, n), 2)
+            dates = rng.choice(days, n).astype(str)
+            cursor.executemany(
+                "INSERT INTO transactions (agent_id, retailer_id, transaction_amount, date) VALUES (?, ?, ?, ?)",
+                zip(agent_ids.tolist(), retailer_ids.tolist(), amounts.tolist(), dates.tolist()),
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def time_queries(engine, repeat: int) -> dict:
+    """Return the median latency in milliseconds of each query"""
+    results = {}
+    with engine.connect() as conn:
+        for name, (sql, params) in QUERIES.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(text(sql), params).scalar()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = round(statistics.median(timings), 3)
+    return results
+
+
+def run(rows: int, agents: int, retailers: int, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Transaction.__table__.create(engine)
+        for index in Transaction.__table__.indexes:
+            index.drop(engine)
+
+        start = time.perf_counter()
+        populate(engine, rows, agents, retailers)
+        load_seconds = time.perf_counter() - start
+
+        scan = time_queries(engine, repeat)
+
+        start = time.perf_counter()
+        for index in Transaction.__table__.indexes:
+            index.create(engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        index_build_seconds = time.perf_counter() - start
+
+        indexed = time_queries(engine, repeat)
+        engine.dispose()
+
+    return {
+        "rows": rows,
+        "load_seconds": round(load_seconds, 2),
+        "index_build_seconds": round(index_build_seconds, 2),
+        "queries": {
+            name: {"scan_ms": scan[name], "index_ms": indexed[name], "speedup": round(scan[name] / max(indexed[name], 1e-6), 1)}
+            for name in QUERIES
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--agents", type=int, default=50_000)
+    parser.add_argument("--retailers", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.agents, args.retailers, args.repeat)
+    print(f"{results['rows']} rows loaded in {results['load_seconds']}s, "
+          f"indexes built in {results['index_build_seconds']}s")
+    print(f"{'query':<18}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+    for name, r in results["queries"].items():
+        print(f"{name:<18}{r['scan_ms']:>12}{r['index_ms']:>12}{r['speedup']:>9}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
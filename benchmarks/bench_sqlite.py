@@ -0,0 +1,140 @@
+"""Load throughput and concurrent read latency of Database under each SQLite profile.
+
+Usage: python -m benchmarks.bench_sqlite --rows 500000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.synthetic import make_transactions
+from src.storage.database import Database
+from src.storage.sqlite_profile import SQLITE_PROFILES, apply_sqlite_profile
+
+# What the API reads while a load runs: a rollup report and a per-agent commission lookup
+READ_QUERIES = (
+    ("SELECT month, total_sales FROM monthly_sales ORDER BY month", {}),
+    ("SELECT total_sales, commission_amount FROM commissions WHERE agent_id = :agent_id", {"agent_id": "A00042"}),
+)
+
+
+def read_loop(engine, stop: threading.Event, latencies: list, errors: list, limit: int = None, interval: float = 0):
+    """Run READ_QUERIES round-robin, one every interval seconds, until stop is set or limit reads are done"""
+    while not stop.wait(interval) and (limit is None or len(latencies) + len(errors) < limit):
+        sql, params = READ_QUERIES[(len(latencies) + len(errors)) % len(READ_QUERIES)]
+        start = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(sql), params).all()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except OperationalError as e:
+            errors.append(str(e.orig))
+
+
+def percentiles(latencies: list) -> dict:
+    if not latencies:
+        return {"p50_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+def timed_load(profile: str, seed_df, load_df, read_interval: float = None, idle_reads: int = 0) -> dict:
+    """Seed a fresh database and time one save_all of load_df, optionally with a reader thread querying throughout"""
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        db = Database(url, init_schema=True, sqlite_profile=profile)
+        db.save_all(seed_df)
+        reader_engine = apply_sqlite_profile(create_engine(url), profile)
+
+        idle, idle_errors = [], []
+        read_loop(reader_engine, threading.Event(), idle, idle_errors, limit=idle_reads)
+
+        stop = threading.Event()
+        latencies, errors = [], []
+        reader = None
+        if read_interval is not None:
+            reader = threading.Thread(target=read_loop, args=(reader_engine, stop, latencies, errors, None, read_interval))
+            reader.start()
+        start = time.perf_counter()
+        try:
+            db.save_all(load_df)
+            seconds = time.perf_counter() - start
+        finally:
+            stop.set()
+            if reader is not None:
+                reader.join()
+            db.close()
+            db.engine.dispose()
+            reader_engine.dispose()
+
+    return {
+        "seconds": round(seconds, 2),
+        "rows_per_sec": round(len(load_df) / seconds),
+        "idle_read": percentiles(idle),
+        "reads": {"count": len(latencies), **percentiles(latencies), "errors": len(errors)},
+    }
+
+
+def run_profile(profile: str, seed_rows: int, rows: int, agents: int, retailers: int, idle_reads: int,
+                read_interval: float) -> dict:
+    """Load throughput on its own, then read latency from a paced reader during a second identical load"""
+    seed_df = make_transactions(seed_rows, agents=agents, retailers=retailers, seed=1)
+    load_df = make_transactions(rows, agents=agents, retailers=retailers, seed=2)
+    solo = timed_load(profile, seed_df, load_df)
+    concurrent = timed_load(profile, seed_df, load_df, read_interval, idle_reads)
+    return {
+        "load_seconds": solo["seconds"],
+        "rows_per_sec": solo["rows_per_sec"],
+        "idle_read": concurrent["idle_read"],
+        "read_during_load": concurrent["reads"],
+        "load_seconds_with_reads": concurrent["seconds"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--seed-rows", type=int, default=50_000)
+    parser.add_argument("--agents", type=int, default=5_000)
+    parser.add_argument("--retailers", type=int, default=20_000)
+    parser.add_argument("--idle-reads", type=int, default=200)
+    parser.add_argument("--read-interval-ms", type=float, default=10,
+                        help="Pause between the reader's queries during the load")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(SQLITE_PROFILES), default=sorted(SQLITE_PROFILES))
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    # Logging I/O is not what this benchmark measures
+    logging.disable(logging.WARNING)
+
+    results = {"rows": args.rows, "profiles": {}}
+    for profile in args.profiles:
+        results["profiles"][profile] = run_profile(profile, args.seed_rows, args.rows, args.agents, args.retailers,
+                                                   args.idle_reads, args.read_interval_ms / 1000)
+
+    print(f"{'profile':<10}{'load s':>10}{'rows/s':>10}{'idle p50':>10}{'reads':>8}{'p50 ms':>10}"
+          f"{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for profile, r in results["profiles"].items():
+        during = r["read_during_load"]
+        print(f"{profile:<10}{r['load_seconds']:>10}{r['rows_per_sec']:>10}{r['idle_read']['p50_ms']:>10}"
+              f"{during['count']:>8}{str(during['p50_ms']):>10}{str(during['p99_ms']):>10}"
+              f"{str(during['max_ms']):>10}{during['errors']:>8}")
+    print("(reads: queries answered by a reader thread during a second, concurrent load)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
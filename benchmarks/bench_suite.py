@@ -0,0 +1,256 @@
+"""Timed ingestion, aggregation, storage and API scenarios on one synthetic dataset.
+
+Usage: python -m benchmarks.bench_suite --rows 1000000 --output results/$(git rev-parse --short HEAD).json
+       python -m benchmarks.bench_suite --rows 1000000 --compare results/<baseline>.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_transactions_csv
+from src.ingestion.reader import DataReader
+from src.processing.aggregator import DataAggregator
+from src.processing.sql_aggregator import SqlAggregator
+from src.storage.database import Database
+
+AGGREGATOR_METHODS = ("sales_by_agent", "sales_by_retailer", "monthly_totals", "calculate_commission")
+API_ENDPOINTS = (
+    "/reports/monthly",
+    "/agents?limit=100",
+    "/retailers?limit=100",
+    "/agents/{agent_id}/commission",
+    "/retailers/{retailer_id}/sales",
+)
+# Fresh-interpreter startup probes, run from the repository root with -X importtime
+STARTUP_PROBES = {
+    "startup.cli_help": ["main.py", "--help"],
+    "startup.load_imports": ["-c", "import src.ingestion.reader, src.processing.aggregator, src.storage.database"],
+    "startup.api_imports": ["-c", "import src.api.routes"],
+}
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_of(fn, repeat: int, setup=None):
+    """Minimum wall time of fn over repeat runs; setup() runs untimed before each run and feeds fn"""
+    timings, result = [], None
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def scenario(seconds: float, rows: int) -> dict:
+    return {"seconds": round(seconds, 4), "rows": rows, "rows_per_sec": round(rows / seconds) if seconds else None}
+
+
+def bench_ingest(csv_path: str, workdir: str, repeat: int):
+    rejects_path = os.path.join(workdir, "rejected_rows.log")
+    return best_of(lambda: DataReader(csv_path, rejects_path=rejects_path).ingest(), repeat)
+
+
+def bench_aggregator(valid: pd.DataFrame, repeat: int) -> dict:
+    results = {}
+    for method in AGGREGATOR_METHODS:
+        # A fresh aggregator per run, so each method pays for the shared totals pass as a caller would
+        seconds, _ = best_of(lambda: getattr(DataAggregator(valid), method)(), repeat)
+        results[f"aggregator.{method}"] = scenario(seconds, len(valid))
+    return results
+
+
+def bench_sql_aggregator(db: Database, rows: int, repeat: int) -> dict:
+    """Same methods as bench_aggregator, computed by the database over the stored transactions"""
+    results = {}
+    for method in AGGREGATOR_METHODS:
+        seconds, _ = best_of(lambda: getattr(SqlAggregator(db.engine), method)(), repeat)
+        results[f"sql_aggregator.{method}"] = scenario(seconds, rows)
+    return results
+
+
+def bench_save_all(valid: pd.DataFrame, commissions: pd.DataFrame, workdir: str, repeat: int):
+    """Time Database.save_all into a new SQLite file per run; return the seconds and the last file"""
+    paths = []
+
+    def setup():
+        paths.append(os.path.join(workdir, f"save_all_{len(paths)}.db"))
+        return Database(f"sqlite:///{paths[-1]}", init_schema=True)
+
+    def run(db):
+        db.save_all(valid, commissions)
+        db.close()
+
+    seconds, _ = best_of(run, repeat, setup)
+    return seconds, paths[-1]
+
+
+def bench_api(db_path: str, agent_id: str, retailer_id: str, requests: int) -> dict:
+    """Latency of each endpoint through TestClient: first (cold cache) request, then p50/p99 of the rest"""
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from src.api import routes
+
+    engine = routes.create_api_engine(f"sqlite+aiosqlite:///{db_path}")
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def get_bench_session():
+        async with Session() as session:
+            yield session
+
+    routes.app.dependency_overrides[routes.get_session] = get_bench_session
+    client = TestClient(routes.app)
+    results = {}
+    try:
+        for endpoint in API_ENDPOINTS:
+            url = endpoint.format(agent_id=agent_id, retailer_id=retailer_id)
+            routes.cache.clear()
+            latencies = []
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+            warm = latencies[1:] or latencies
+            results[f"api.GET {endpoint}"] = {
+                "first_ms": round(latencies[0], 3),
+                "p50_ms": round(float(np.percentile(warm, 50)), 3),
+                "p99_ms": round(float(np.percentile(warm, 99)), 3),
+            }
+    finally:
+        routes.app.dependency_overrides.clear()
+        routes.cache.clear()
+    return results
+
+
+def bench_startup(repeat: int) -> dict:
+    """Wall time of each startup probe and the import time it reports, with its heaviest top-level imports"""
+    results = {}
+    for name, probe in STARTUP_PROBES.items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-X", "importtime", *probe], cwd=REPO_ROOT,
+                                  capture_output=True, text=True, check=True)
+            timings.append(time.perf_counter() - start)
+
+        # Lines read "import time: self | cumulative | module", nested modules indented by two spaces per level
+        top_level = {}
+        for line in proc.stderr.splitlines():
+            fields = line.removeprefix("import time:").split("|")
+            if not line.startswith("import time:") or len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            if len(fields[2]) - len(fields[2].lstrip()) == 1:
+                top_level[fields[2].strip()] = int(fields[1])
+        heaviest = sorted(top_level.items(), key=lambda item: -item[1])[:5]
+        results[name] = {
+            "seconds": round(min(timings), 4),
+            "import_ms": round(sum(top_level.values()) / 1000, 1),
+            "heaviest_imports_ms": {module: round(us / 1000, 1) for module, us in heaviest},
+        }
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Names of scenarios slower than the baseline by more than threshold (0.2 = 20%)"""
+    regressions = []
+    print(f"\nvs. baseline {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        metric = "seconds" if "seconds" in current else "p50_ms"
+        if not previous or not previous.get(metric):
+            continue
+        ratio = current[metric] / previous[metric]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"  {name:<40} {previous[metric]:>10} -> {current[metric]:>10} {metric:<8} {ratio:>6.2f}x {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--agents", type=int, default=5_000)
+    parser.add_argument("--retailers", type=int, default=20_000)
+    parser.add_argument("--start", default="2024-01-01")
+    parser.add_argument("--end", default="2024-12-31")
+    parser.add_argument("--invalid-ratio", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--api-requests", type=int, default=200)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results JSON from an earlier commit to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Slowdown ratio above which --compare reports a regression and exits 1")
+    args = parser.parse_args(argv)
+
+    # Logging I/O is not what this suite measures
+    logging.disable(logging.WARNING)
+
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "threshold")}
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "params": params,
+        "scenarios": {},
+    }
+    scenarios = results["scenarios"]
+    scenarios.update(bench_startup(args.repeat))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "transactions.csv")
+        write_transactions_csv(csv_path, args.rows, agents=args.agents, retailers=args.retailers, start=args.start,
+                               end=args.end, seed=args.seed, invalid_ratio=args.invalid_ratio)
+
+        seconds, valid = bench_ingest(csv_path, workdir, args.repeat)
+        scenarios["reader.ingest"] = scenario(seconds, args.rows)
+        scenarios.update(bench_aggregator(valid, args.repeat))
+
+        commissions = DataAggregator(valid).calculate_commission()
+        seconds, db_path = bench_save_all(valid, commissions, workdir, args.repeat)
+        scenarios["database.save_all"] = scenario(seconds, len(valid))
+
+        db = Database(f"sqlite:///{db_path}")
+        scenarios.update(bench_sql_aggregator(db, len(valid), args.repeat))
+        db.close()
+
+        scenarios.update(bench_api(db_path, str(valid["agent_id"].iloc[0]), str(valid["retailer_id"].iloc[0]),
+                                   args.api_requests))
+
+    for name, values in scenarios.items():
+        print(f"{name:<40} {values}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
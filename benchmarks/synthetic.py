@@ -0,0 +1,57 @@
+"""Deterministic synthetic transaction data for benchmarks."""
+import numpy as np
+import pandas as pd
+
+# Raw-row defects injected by invalid_ratio, one per DataReader.validate reject reason family
+DEFECTS = ("missing_agent_id", "missing_retailer_id", "invalid_amount", "invalid_date")
+
+
+def make_transactions(rows: int, agents: int = 50_000, retailers: int = 200_000, start: str = "2024-01-01",
+                      days: int = 366, seed: int = 42, end: str = None, invalid_ratio: float = 0.0) -> pd.DataFrame:
+    """Return an ingested-shape frame (parsed dates, float amounts) with the given cardinalities
+
+    Dates are uniform over [start, end] when end is given, else over `days` days from start. With
+    invalid_ratio > 0 that fraction of rows gets one defect each, and the amount and date columns
+    become raw strings like a CSV read would produce.
+    """
+    if end is not None:
+        days = int((np.datetime64(end, "D") - np.datetime64(start, "D")).astype(int)) + 1
+    rng = np.random.default_rng(seed)
+    agent_ids = np.array([f"A{i:05d}" for i in range(agents)], dtype=object)
+    retailer_ids = np.array([f"R{i:06d}" for i in range(retailers)], dtype=object)
+    df = pd.DataFrame({
+        "agent_id": agent_ids[rng.integers(0, agents, rows)],
+        "retailer_id": retailer_ids[rng.integers(0, retailers, rows)],
+        "transaction_amount": np.round(rng.uniform(1, 5000, rows), 2),
+        "date": np.datetime64(start, "D") + rng.integers(0, days, rows).astype("timedelta64[D]"),
+    })
+    if invalid_ratio > 0:
+        df = inject_defects(df, invalid_ratio, rng)
+    return df
+
+
+def inject_defects(df: pd.DataFrame, invalid_ratio: float, rng: np.random.Generator) -> pd.DataFrame:
+    """Return a raw-string copy of df where invalid_ratio of the rows each carry one of DEFECTS"""
+    df = df.assign(
+        transaction_amount=df["transaction_amount"].map("{:.2f}".format).astype(object),
+        date=df["date"].dt.strftime("%Y-%m-%d").astype(object),
+    )
+    positions = rng.choice(len(df), size=int(len(df) * invalid_ratio), replace=False)
+    for i, defect in enumerate(DEFECTS):
+        rows = positions[i::len(DEFECTS)]
+        if defect == "missing_agent_id":
+            df.iloc[rows, df.columns.get_loc("agent_id")] = None
+        elif defect == "missing_retailer_id":
+            df.iloc[rows, df.columns.get_loc("retailer_id")] = None
+        elif defect == "invalid_amount":
+            df.iloc[rows, df.columns.get_loc("transaction_amount")] = "abc"
+        else:
+            df.iloc[rows, df.columns.get_loc("date")] = "not-a-date"
+    return df
+
+
+def write_transactions_csv(path: str, rows: int, **kwargs) -> pd.DataFrame:
+    """Write a raw transactions CSV like data/transactions.csv; kwargs go to make_transactions"""
+    df = make_transactions(rows, **kwargs)
+    df.to_csv(path, index=False, date_format="%Y-%m-%d")
+    return df
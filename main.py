@@ -1,48 +1,97 @@
+import argparse
+import os
 import sys
-from src.utils.logger import setup_logger
+from datetime import date
+from src.utils.logger import configure_logging, setup_logger, shutdown_logging
+from src.utils.metrics import metrics
 
-def run_pipeline():
-    """Run the data pipeline"""
+METRICS_REPORT_PATH = "logs/run_metrics.json"
+
+def run_pipeline(file_path: str = "data/transactions.csv", chunksize: int = None, incremental: bool = True,
+                 workers: int = 1, stage_dir: str = None, metrics_path: str = METRICS_REPORT_PATH,
+                 commissions_in_db: bool = False, sqlite_profile: str = "default"):
+    """Run the data pipeline; incremental runs only load rows appended since the last run"""
     logger = setup_logger("main", "logs/pipeline.log")
     logger.info("=== Starting Data Pipeline ===")
+    metrics.reset()
+    status = "failed"
     
     try:
+        if workers > 1 and chunksize:
+            raise ValueError("--chunksize streams files one after another and cannot be combined with --workers")
+        
         # Import here to ensure logger is set up first
-        from src.ingestion.reader import DataReader
+        from src.ingestion.columnar import stage_batch
         from src.processing.aggregator import DataAggregator
+        from src.processing.parallel import resolve_inputs
         from src.storage.database import Database
         
-        # Phase 1: Ingest
-        logger.info("Phase 1: Data Ingestion")
-        reader = DataReader("data/transactions.csv")
-        valid_data = reader.ingest()
-        
-        # Phase 2: Process
-        logger.info("Phase 2: Data Processing")
-        aggregator = DataAggregator(valid_data)
-        
-        print("\n--- Sales by Agent ---")
-        print(aggregator.sales_by_agent())
-        
-        print("\n--- Sales by Retailer ---")
-        print(aggregator.sales_by_retailer())
+        db = Database(sqlite_profile=sqlite_profile)
+        readers = []
+        for path in resolve_inputs(file_path):
+            reader = open_reader(path, db, logger, full=not incremental)
+            if reader is not None:
+                readers.append(reader)
+        if not readers:
+            logger.info("No new data since last run")
+            db.close()
+            status = "no_new_data"
+            logger.info("=== Pipeline Completed Successfully ===")
+            return
         
-        print("\n--- Monthly Totals ---")
-        print(aggregator.monthly_totals())
-        
-        print("\n--- Commissions ---")
-        commissions = aggregator.calculate_commission()
-        print(commissions)
-        
-        # Phase 3: Storage
-        logger.info("Phase 3: Data Storage")
-        print("\n--- Saving to Database ---")
-        db = Database()
-        db.save_all(valid_data, commissions)
+        # The rows and the watermarks covering them commit together: a failed run leaves neither behind
+        with db.transaction():
+            if not incremental:
+                # A full reload replaces what earlier loads took from these files instead of adding to it
+                db.remove_sources([reader.file_path for reader in readers])
+            if chunksize:
+                rows_loaded = run_streaming(readers, db, chunksize, logger, stage_dir, commissions_in_db)
+            elif len(readers) > 1 or workers > 1:
+                rows_loaded = run_parallel(readers, db, workers, logger, stage_dir, commissions_in_db)
+            else:
+                reader = readers[0]
+                
+                # Phase 1: Ingest
+                logger.info("Phase 1: Data Ingestion")
+                valid_data = reader.ingest()
+                
+                # Phase 2: Process
+                logger.info("Phase 2: Data Processing")
+                aggregator = DataAggregator(valid_data)
+                
+                print("\n--- Sales by Agent ---")
+                print(aggregator.sales_by_agent())
+                
+                print("\n--- Sales by Retailer ---")
+                print(aggregator.sales_by_retailer())
+                
+                print("\n--- Monthly Totals ---")
+                print(aggregator.monthly_totals())
+                
+                commissions = None
+                if not commissions_in_db:
+                    print("\n--- Commissions ---")
+                    commissions = update_commissions(db, aggregator.sales_by_agent(),
+                                                     DataAggregator.period_end(aggregator.monthly_totals()))
+                    print(commissions)
+                
+                # Phase 3: Storage
+                logger.info("Phase 3: Data Storage")
+                print("\n--- Saving to Database ---")
+                # Without a commissions frame save_all recomputes them in the database
+                db.save_all(valid_data, commissions, replace_commissions=False, source_id=db.source_id(reader.file_path))
+                if stage_dir:
+                    stage_batch(valid_data, stage_dir)
+                rows_loaded = [len(valid_data)]
+            
+            for reader, rows in zip(readers, rows_loaded):
+                db.record_watermark(reader.file_path, reader.end_offset, reader.content_hash(reader.end_offset), rows,
+                                    reader.first_row + reader.rows_read)
         db.close()
+        status = "succeeded"
         
         logger.info("=== Pipeline Completed Successfully ===")
-        
+    
     except FileNotFoundError as e:
         logger.error(f"File error: {e}")
         print(f"Error: {e}")
@@ -51,6 +100,238 @@ def run_pipeline():
         logger.error(f"Pipeline failed: {e}")
         print(f"Error: {e}")
         sys.exit(1)
+    finally:
+        # Per-run stage timings, also written when the run fails
+        if metrics_path:
+            report = metrics.write_report(metrics_path, status=status, file=file_path)
+            logger.info(f"Run metrics written to {metrics_path} ({report['wall_seconds']:.2f}s)")
+        # Drain queued log records before the process exits
+        shutdown_logging()
+
+def open_reader(file_path: str, db, logger, full: bool = False):
+    """Return a DataReader over the complete lines appended since the stored watermark, or None if nothing is new
+    
+    full reads from the start regardless of the watermark; run_pipeline then replaces the rows earlier
+    loads took from the file. Without full, a file rewritten since its last load is refused, since its
+    earlier rows are still stored and would be counted twice.
+    """
+    from src.ingestion.reader import DataReader
+    
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+    
+    reader = DataReader(file_path)
+    start_offset, content_hash = (0, None) if full else db.get_watermark(file_path)
+    if start_offset and (start_offset > os.path.getsize(file_path) or reader.content_hash(start_offset) != content_hash):
+        raise RuntimeError(f"{file_path} was rewritten since the last run; rerun with --full to replace its earlier rows")
+    
+    end_offset = reader.complete_end(start_offset)
+    if end_offset < os.path.getsize(file_path):
+        logger.info(f"{file_path} ends with an unterminated line; leaving it for the next run")
+    if start_offset >= end_offset:
+        return None
+    logger.info(f"Reading {file_path} from byte {start_offset} to {end_offset}")
+    
+    # Number appended rows by their place in the file; ledgers written before rows_read existed are counted once
+    first_row = 0 if full else db.first_row(file_path)
+    if first_row is None:
+        first_row = reader.rows_before(start_offset)
+    return DataReader(file_path, start_offset=start_offset, end_offset=end_offset, schema=reader.schema,
+                      first_row=first_row)
+
+def update_commissions(db, agent_sales, as_of=None):
+    """Compute commissions with the plans active on as_of for agent_sales added to the stored per-agent totals"""
+    from src.processing.aggregator import DataAggregator
+    from src.processing.commission import CommissionRules
+    
+    stored = db.get_agent_totals(agent_sales["agent_id"])
+    agent_sales = DataAggregator.merge_totals([stored, agent_sales], "agent_id")
+    return DataAggregator.apply_commission(agent_sales, CommissionRules.load(), as_of)
+
+def fold_partial(running: list, partial, key: str) -> list:
+    """Merge a batch's partial totals into the running total; one frame is kept, so memory follows key cardinality"""
+    from src.processing.aggregator import DataAggregator
+    
+    return [DataAggregator.merge_totals(running + [partial], key)]
+
+def print_merged_partials(agent_partials, retailer_partials, monthly_partials):
+    """Merge per-batch or per-file partial aggregates, print them and return the merged agent and monthly totals"""
+    from src.processing.aggregator import DataAggregator
+    
+    print("\n--- Sales by Agent ---")
+    agent_sales = DataAggregator.merge_totals(agent_partials, "agent_id")
+    print(agent_sales)
+    
+    print("\n--- Sales by Retailer ---")
+    print(DataAggregator.merge_totals(retailer_partials, "retailer_id"))
+    
+    print("\n--- Monthly Totals ---")
+    monthly = DataAggregator.merge_totals(monthly_partials, "month")
+    print(monthly)
+    return agent_sales, monthly
+
+def save_merged_partials(db, agent_partials, retailer_partials, monthly_partials,
+                         commissions_in_db: bool = False):
+    """Merge per-batch or per-file partial aggregates, print them and save the commissions"""
+    from src.processing.aggregator import DataAggregator
+    
+    agent_sales, monthly = print_merged_partials(agent_partials, retailer_partials, monthly_partials)
+    if commissions_in_db:
+        print("\n--- Saving to Database ---")
+        db.refresh_commissions()
+        db.mark_loaded()
+        return
+    
+    print("\n--- Commissions ---")
+    commissions = update_commissions(db, agent_sales, DataAggregator.period_end(monthly))
+    print(commissions)
+    
+    print("\n--- Saving to Database ---")
+    db.save_commissions(commissions, replace=False)
+    db.mark_loaded()
+
+def run_streaming(readers, db, chunksize: int, logger, stage_dir: str = None,
+                  commissions_in_db: bool = False) -> list[int]:
+    """Ingest, aggregate and store the files batch by batch with bounded memory; return rows loaded per file"""
+    from src.ingestion.columnar import stage_batch
+    from src.processing.aggregator import DataAggregator
+    
+    agent_partials, retailer_partials, monthly_partials = [], [], []
+    rows_loaded = []
+    
+    try:
+        # Phases 1-3 per batch: only the running totals outlive each batch
+        logger.info(f"Streaming ingestion, processing and storage (chunksize={chunksize})")
+        for reader in readers:
+            rows_loaded.append(0)
+            source_id = db.source_id(reader.file_path)
+            for batch_number, batch in enumerate(reader.ingest_stream(chunksize), start=1):
+                aggregator = DataAggregator(batch)
+                agent_partials = fold_partial(agent_partials, aggregator.sales_by_agent(), "agent_id")
+                retailer_partials = fold_partial(retailer_partials, aggregator.sales_by_retailer(), "retailer_id")
+                monthly_partials = fold_partial(monthly_partials, aggregator.monthly_totals(), "month")
+                db.save_batch(batch, source_id=source_id)
+                if stage_dir:
+                    stage_batch(batch, stage_dir)
+                rows_loaded[-1] += len(batch)
+                logger.info(f"{reader.file_path} batch {batch_number}: stored {len(batch)} rows")
+        
+        save_merged_partials(db, agent_partials, retailer_partials, monthly_partials, commissions_in_db)
+        return rows_loaded
+    except Exception:
+        db.session.rollback()
+        raise
+
+def run_parallel(readers, db, workers: int, logger, stage_dir: str = None,
+                 commissions_in_db: bool = False) -> list[int]:
+    """Read, validate and pre-aggregate files across a process pool; store and merge in this process"""
+    from src.ingestion.columnar import stage_batch
+    from src.processing.parallel import ingest_files
+    
+    agent_partials, retailer_partials, monthly_partials = [], [], []
+    rows_loaded = []
+    
+    try:
+        logger.info(f"Parallel ingestion of {len(readers)} files with {workers} workers")
+        for reader, result in zip(readers, ingest_files(readers, workers)):
+            # The worker read the range; the watermark needs its row count
+            reader.rows_read = result["rows_read"]
+            agent_partials.append(result["sales_by_agent"])
+            retailer_partials.append(result["sales_by_retailer"])
+            monthly_partials.append(result["monthly_totals"])
+            db.save_batch(result["data"], source_id=db.source_id(result["file_path"]))
+            if stage_dir:
+                stage_batch(result["data"], stage_dir)
+            rows_loaded.append(len(result["data"]))
+            failing = {rule: count for rule, count in result["rule_counts"].items() if count}
+            logger.info(f"{result['file_path']}: stored {len(result['data'])} rows; failing rows per rule: {failing}")
+        
+        save_merged_partials(db, agent_partials, retailer_partials, monthly_partials, commissions_in_db)
+        return rows_loaded
+    except Exception:
+        db.session.rollback()
+        raise
+
+def iter_valid_batches(file_path: str, chunksize: int = None):
+    """Yield (path, validated batch) for every input file, streamed in chunks when chunksize is set"""
+    from src.ingestion.reader import DataReader
+    from src.processing.parallel import resolve_inputs
+    
+    for path in resolve_inputs(file_path):
+        reader = DataReader(path)
+        batches = reader.ingest_stream(chunksize) if chunksize else [reader.ingest()]
+        for batch in batches:
+            yield path, batch
+
+def run_ingest(file_path: str = "data/transactions.csv", chunksize: int = None, stage_dir: str = None):
+    """Read and validate the input without touching the database; optionally stage the valid rows"""
+    logger = setup_logger("main", "logs/pipeline.log")
+    try:
+        from src.ingestion.columnar import stage_batch
+        
+        valid_rows = {}
+        for path, batch in iter_valid_batches(file_path, chunksize):
+            valid_rows[path] = valid_rows.get(path, 0) + len(batch)
+            if stage_dir:
+                stage_batch(batch, stage_dir)
+        for path, rows in valid_rows.items():
+            print(f"{path}: {rows} valid rows")
+        logger.info(f"Ingest check complete: {sum(valid_rows.values())} valid rows in {len(valid_rows)} files")
+    except Exception as e:
+        logger.error(f"Ingest failed: {e}")
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        shutdown_logging()
+
+def run_aggregate(file_path: str = "data/transactions.csv", chunksize: int = None, db_url: str = None,
+                  date_from: date = None, date_to: date = None, sqlite_profile: str = "default"):
+    """Print the sales reports and commissions for the input, or for the stored transactions if db_url is set"""
+    logger = setup_logger("main", "logs/pipeline.log")
+    try:
+        from src.processing.aggregator import DataAggregator
+        from src.processing.commission import CommissionRules
+        
+        agent_partials, retailer_partials, monthly_partials = [], [], []
+        if db_url:
+            from src.processing.sql_aggregator import SqlAggregator
+            from src.storage.database import Database
+            
+            # Full-history totals computed by the database, so the stored rows never enter memory
+            db = Database(db_url, sqlite_profile=sqlite_profile)
+            try:
+                aggregator = SqlAggregator(db.engine, date_from, date_to)
+                logger.info(f"Aggregating stored transactions in {db_url} (from={date_from}, to={date_to})")
+                agent_partials.append(aggregator.sales_by_agent())
+                retailer_partials.append(aggregator.sales_by_retailer())
+                monthly_partials.append(aggregator.monthly_totals())
+            finally:
+                db.close()
+        else:
+            for _, batch in iter_valid_batches(file_path, chunksize):
+                aggregator = DataAggregator(batch)
+                agent_partials = fold_partial(agent_partials, aggregator.sales_by_agent(), "agent_id")
+                retailer_partials = fold_partial(retailer_partials, aggregator.sales_by_retailer(), "retailer_id")
+                monthly_partials = fold_partial(monthly_partials, aggregator.monthly_totals(), "month")
+        
+        agent_sales, monthly = print_merged_partials(agent_partials, retailer_partials, monthly_partials)
+        print("\n--- Commissions ---")
+        print(DataAggregator.apply_commission(agent_sales, CommissionRules.load(), DataAggregator.period_end(monthly)))
+    except Exception as e:
+        logger.error(f"Aggregation failed: {e}")
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        shutdown_logging()
+
+def init_db(db_url: str = "sqlite:///data/pipeline.db", sqlite_profile: str = "default"):
+    """Create the database schema, indexes and rollups; needed once before the first load"""
+    from src.storage.database import Database
+    
+    # WAL mode, if the profile sets it, is persistent: later connections keep using it
+    db = Database(db_url, init_schema=True, sqlite_profile=sqlite_profile)
+    db.close()
+    print(f"Initialized database schema at {db_url}")
 
 def run_api():
     """Run the API server"""
@@ -60,8 +341,107 @@ def run_api():
     print("API docs available at http://localhost:8000/docs")
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
+def run_bench(bench_args: list[str]):
+    """Run the benchmark suite; bench_args are passed to benchmarks.bench_suite"""
+    from benchmarks import bench_suite
+    bench_suite.main(bench_args)
+
+# Subcommands; `pipeline` is the previous name of `load`
+COMMANDS = ("init-db", "ingest", "aggregate", "load", "pipeline", "api", "bench")
+
+def build_parser() -> argparse.ArgumentParser:
+    """CLI parser; only argparse is imported here so `--help` and dispatch stay fast"""
+    parser = argparse.ArgumentParser(description="Data pipeline and analytics API")
+    subparsers = parser.add_subparsers(dest="command", metavar="{init-db,ingest,aggregate,load,api,bench}")
+    
+    logging_options = argparse.ArgumentParser(add_help=False)
+    logging_options.add_argument("--log-async", action="store_true",
+                                 help="Write logs from a background thread instead of the calling thread")
+    logging_options.add_argument("--log-json", action="store_true",
+                                 help="Write logs as one JSON object per line")
+    logging_options.add_argument("--log-sample-warnings", type=int, metavar="N", default=None,
+                                 help="Keep only one of every N warning records")
+    
+    db_options = argparse.ArgumentParser(add_help=False)
+    db_options.add_argument("--sqlite-profile", choices=("default", "tuned"),
+                            default=os.getenv("PIPELINE_SQLITE_PROFILE", "default"),
+                            help="SQLite connection settings; tuned enables WAL and larger caches (see README)")
+    
+    input_options = argparse.ArgumentParser(add_help=False)
+    input_options.add_argument("--file", default="data/transactions.csv",
+                               help="Input CSV file, directory of CSV files, or glob pattern")
+    input_options.add_argument("--chunksize", type=int, default=None,
+                               help="Stream the input in batches of this many rows")
+    
+    command = subparsers.add_parser("init-db", parents=[db_options, logging_options],
+                                    help="Create the database schema (run once before the first load)")
+    command.add_argument("--db", default="sqlite:///data/pipeline.db", help="Database URL")
+    command.set_defaults(handler=lambda args: init_db(args.db, args.sqlite_profile))
+    
+    command = subparsers.add_parser("ingest", parents=[input_options, logging_options],
+                                    help="Read and validate the input without loading it")
+    command.add_argument("--stage", metavar="DIR",
+                         help="Write validated rows to a month-partitioned Parquet dataset in DIR")
+    command.set_defaults(handler=lambda args: run_ingest(args.file, args.chunksize, args.stage))
+    
+    command = subparsers.add_parser("aggregate", parents=[input_options, db_options, logging_options],
+                                    help="Print sales reports and commissions for the input without loading it")
+    command.add_argument("--from-db", metavar="DB_URL", nargs="?", const="sqlite:///data/pipeline.db",
+                         help="Aggregate the transactions already stored in the database (default "
+                              "sqlite:///data/pipeline.db) with SQL instead of reading --file")
+    command.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", type=date.fromisoformat,
+                         help="With --from-db, only aggregate transactions on or after this date")
+    command.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", type=date.fromisoformat,
+                         help="With --from-db, only aggregate transactions on or before this date")
+    command.set_defaults(handler=lambda args: run_aggregate(args.file, args.chunksize, args.from_db,
+                                                            args.date_from, args.date_to, args.sqlite_profile))
+    
+    command = subparsers.add_parser("load", aliases=["pipeline"], parents=[input_options, db_options, logging_options],
+                                    help="Ingest, aggregate and store the input (default)")
+    command.add_argument("--full", action="store_true",
+                         help="Reload the whole file, replacing the rows earlier loads took from it")
+    command.add_argument("--workers", type=int, default=1,
+                         help="Processes used to read and pre-aggregate multiple input files")
+    command.add_argument("--stage", metavar="DIR",
+                         help="Also write validated rows to a month-partitioned Parquet dataset in DIR")
+    command.add_argument("--commissions-in-db", action="store_true",
+                         help="Compute commissions with one INSERT ... SELECT in the database instead of in pandas")
+    command.add_argument("--metrics-report", default=METRICS_REPORT_PATH, metavar="PATH",
+                         help="Write per-stage wall time, rows/sec and peak RSS of the run as JSON to PATH")
+    command.set_defaults(handler=lambda args: run_pipeline(
+        args.file, args.chunksize, incremental=not args.full, workers=args.workers,
+        stage_dir=args.stage, metrics_path=args.metrics_report, commissions_in_db=args.commissions_in_db,
+        sqlite_profile=args.sqlite_profile,
+    ))
+    
+    command = subparsers.add_parser("api", parents=[logging_options], help="Run the API server")
+    command.set_defaults(handler=lambda args: run_api())
+    
+    # Listed for --help only; main() forwards everything after `bench` to the suite
+    subparsers.add_parser("bench", help="Run the benchmark suite (see `main.py bench --help`)")
+    
+    return parser
+
+def main(argv: list[str] = None):
+    """Parse the command line and run the chosen subcommand"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Without a subcommand, `python main.py [--file ...]` runs a load as before
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["load"] + argv
+    if argv[0] == "bench":
+        # argparse cannot forward options like --rows through a subparser, so hand them over as-is
+        return run_bench(argv[1:])
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if (getattr(args, "date_from", None) or getattr(args, "date_to", None)) and not args.from_db:
+        parser.error("--from and --to filter stored transactions and require --from-db")
+    
+    configure_logging(
+        async_mode=getattr(args, "log_async", False) or None,
+        json_format=getattr(args, "log_json", False) or None,
+        sample_every={"WARNING": args.log_sample_warnings} if getattr(args, "log_sample_warnings", None) else None,
+    )
+    args.handler(args)
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1 and sys.argv[1] == "api":
-        run_api()
-    else:
-        run_pipeline()
\ No newline at end of file
+    main()
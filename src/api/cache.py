@@ -0,0 +1,110 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from fastapi import Request, Response
+from sqlalchemy import select
+from src.storage.models import DataVersion
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True if an If-None-Match header lists etag (weak comparison) or is *"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+class ResponseCache:
+    """In-process LRU cache of serialized JSON responses with TTL, keyed by URL.
+
+    Entries are tagged with the data generation that Database.save_all bumps after
+    every load, so a pipeline run invalidates everything without a TTL wait.
+    """
+    
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0,
+                 check_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = None
+        self._generation_checked_at = 0.0
+    
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        self._entries.clear()
+        self._bytes = 0
+        self._generation = None
+        self._generation_checked_at = 0.0
+    
+    async def generation(self, session) -> int:
+        """Current data generation, re-read from the database at most every check_interval seconds"""
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_checked_at >= self.check_interval:
+            generation = await session.scalar(select(DataVersion.generation).where(DataVersion.id == 1))
+            self._generation = generation or 0
+            self._generation_checked_at = now
+        return self._generation
+    
+    def _get(self, key: str, generation: int):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry_generation, expires_at, etag, body = entry
+        if entry_generation != generation or expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return etag, body
+    
+    def _put(self, key: str, generation: int, etag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (generation, time.monotonic() + self.ttl, etag, body)
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+    
+    def _remove(self, key: str):
+        _, _, _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+    
+    async def respond(self, request: Request, session, build) -> Response:
+        """Serve a cached response for the request URL, calling the async build() on a miss"""
+        key = f"{request.url.path}?{request.url.query}"
+        generation = await self.generation(session)
+        cached = self._get(key, generation)
+        
+        if cached is None:
+            self.misses += 1
+            body = json.dumps(await build(), separators=(",", ":")).encode()
+            etag = f'"{generation}-{hashlib.sha1(body).hexdigest()}"'
+            self._put(key, generation, etag, body)
+        else:
+            self.hits += 1
+            etag, body = cached
+        
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "generation": self._generation,
+        }
@@ -1,83 +1,208 @@
-from fastapi import FastAPI, HTTPException
-from sqlalchemy import create_engine, func
-from sqlalchemy.orm import sessionmaker
-from src.storage.models import Agent, Retailer, Transaction, Commission
+import importlib.util
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import AsyncIterator, Literal
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy import String, func, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from src.api.cache import ResponseCache
+from src.api.streaming import gzip_stream, iter_batches, stream_arrow, stream_csv, stream_json, stream_ndjson
+from src.storage.models import Agent, Retailer, Transaction, Commission, MonthlySales, RetailerSales, month_expr
+from src.storage.sqlite_profile import apply_sqlite_profile
+from src.utils.logger import shutdown_logging
+from src.utils.metrics import metrics
 
-app = FastAPI(title="Data Pipeline API")
+# Database connection (async driver: aiosqlite locally, asyncpg for PostgreSQL)
+DB_URL = os.getenv("API_DB_URL", "sqlite+aiosqlite:///data/pipeline.db")
+DB_POOL_SIZE = int(os.getenv("API_DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("API_DB_MAX_OVERFLOW", "20"))
+DB_SQLITE_PROFILE = os.getenv("API_DB_SQLITE_PROFILE", "default")
 
-# Database connection
-engine = create_engine("sqlite:///data/pipeline.db")
-Session = sessionmaker(bind=engine)
+def create_api_engine(db_url: str = DB_URL, pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW,
+                      sqlite_profile: str = DB_SQLITE_PROFILE):
+    """Create the async engine with a bounded connection pool and the SQLite profile's PRAGMAs"""
+    if ":memory:" in db_url or db_url.endswith("://"):
+        # In-memory SQLite only exists on a single shared connection
+        return apply_sqlite_profile(create_async_engine(db_url, poolclass=StaticPool), sqlite_profile)
+    engine = create_async_engine(db_url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+    return apply_sqlite_profile(engine, sqlite_profile)
+
+engine = create_api_engine()
+Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await engine.dispose()
+    shutdown_logging()
+
+class RequestTimer:
+    """ASGI middleware recording each request's latency as an api.<method> <route> stage
+    
+    The timer stops on the last body message, so streamed responses are timed to their end rather than
+    to their headers.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        recorded = False
+        
+        def record():
+            nonlocal recorded
+            if not recorded:
+                recorded = True
+                # The router stores the matched route in the shared scope
+                route = scope.get("route")
+                metrics.record(f"api.{scope['method']} {route.path if route else 'unmatched'}", time.perf_counter() - start)
+        
+        async def timed_send(message):
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+        
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            # Requests that failed or were cut off before their last body message
+            record()
+
+app = FastAPI(title="Data Pipeline API", lifespan=lifespan)
+app.add_middleware(RequestTimer)
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """Provide one pooled session per request, returned to the pool when the request ends"""
+    async with Session() as session:
+        yield session
+
+# Report responses only change when the pipeline loads data, see Database.mark_loaded
+cache = ResponseCache(
+    max_entries=int(os.getenv("API_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("API_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("API_CACHE_TTL", "300")),
+)
+
+# Keyset pagination defaults for list endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Data Pipeline API is running"}
 
 @app.get("/agents/{agent_id}/commission")
-def get_agent_commission(agent_id: str):
+async def get_agent_commission(agent_id: str, session: AsyncSession = Depends(get_session)):
     """Get commission details for a specific agent"""
-    session = Session()
-    try:
-        commission = session.query(Commission).filter_by(agent_id=agent_id).first()
-        if not commission:
-            raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
-        
-        return {
-            "agent_id": commission.agent_id,
-            "total_sales": commission.total_sales,
-            "commission_rate": commission.commission_rate,
-            "commission_amount": commission.commission_amount
-        }
-    finally:
-        session.close()
+    commission = await session.scalar(select(Commission).filter_by(agent_id=agent_id).limit(1))
+    if not commission:
+        raise HTTPException(status_code=404, detail=f"Agent {agent_id} not found")
+    
+    return {
+        "agent_id": commission.agent_id,
+        "total_sales": commission.total_sales,
+        "commission_rate": commission.commission_rate,
+        "commission_amount": commission.commission_amount
+    }
 
 @app.get("/retailers/{retailer_id}/sales")
-def get_retailer_sales(retailer_id: str):
+async def get_retailer_sales(retailer_id: str, session: AsyncSession = Depends(get_session)):
     """Get total sales for a specific retailer"""
-    session = Session()
-    try:
-        total_sales = session.query(func.sum(Transaction.transaction_amount)).filter_by(retailer_id=retailer_id).scalar()
-        
-        if total_sales is None:
-            raise HTTPException(status_code=404, detail=f"Retailer {retailer_id} not found")
-        
-        return {
-            "retailer_id": retailer_id,
-            "total_sales": total_sales
-        }
-    finally:
-        session.close()
+    rollup = await session.get(RetailerSales, retailer_id)
+    
+    if rollup is None:
+        raise HTTPException(status_code=404, detail=f"Retailer {retailer_id} not found")
+    
+    return {
+        "retailer_id": retailer_id,
+        "total_sales": rollup.total_sales
+    }
 
 @app.get("/reports/monthly")
-def get_monthly_report():
+async def get_monthly_report(request: Request, session: AsyncSession = Depends(get_session)):
     """Get monthly sales report"""
-    session = Session()
-    try:
-        transactions = session.query(Transaction).all()
-        
-        # Aggregate by month
-        monthly_data = {}
-        for t in transactions:
-            month_key = t.date.strftime("%Y-%m")
-            if month_key not in monthly_data:
-                monthly_data[month_key] = 0
-            monthly_data[month_key] += t.transaction_amount
+    async def build():
+        # Read the rollup maintained at load time instead of scanning transactions
+        months = (await session.scalars(select(MonthlySales).order_by(MonthlySales.month))).all()
         
         return {
             "monthly_sales": [
-                {"month": month, "total_sales": sales}
-                for month, sales in sorted(monthly_data.items())
+                {"month": m.month, "total_sales": m.total_sales}
+                for m in months
             ]
         }
-    finally:
-        session.close()
+    
+    return await cache.respond(request, session, build)
+
+def sales_report_query(group_by: list[str], date_from: date = None, date_to: date = None,
+                       agent_ids: list[str] = None, retailer_ids: list[str] = None, dialect: str = "sqlite"):
+    """One GROUP BY over transactions: total sales and transaction count per combination of the group_by dimensions"""
+    dimensions = {
+        "agent": Transaction.agent_id.label("agent_id"),
+        "retailer": Transaction.retailer_id.label("retailer_id"),
+        "month": month_expr(Transaction.date, dialect).label("month"),
+        "day": Transaction.date.label("day"),
+    }
+    keys = [dimensions[name] for name in dict.fromkeys(group_by)]
+    query = select(*keys, func.sum(Transaction.transaction_amount).label("total_sales"),
+                   func.count().label("transactions"))
+    
+    # Filters are plain column predicates so the date/agent/retailer indexes apply
+    if date_from is not None:
+        query = query.where(Transaction.date >= date_from)
+    if date_to is not None:
+        query = query.where(Transaction.date <= date_to)
+    if agent_ids:
+        query = query.where(Transaction.agent_id.in_(agent_ids))
+    if retailer_ids:
+        query = query.where(Transaction.retailer_id.in_(retailer_ids))
+    return query.group_by(*keys).order_by(*keys)
+
+@app.get("/reports/sales")
+async def get_sales_report(
+    group_by: list[Literal["agent", "retailer", "month", "day"]] = Query(["month"]),
+    date_from: date = Query(None, alias="from"),
+    date_to: date = Query(None, alias="to"),
+    agent_id: list[str] = Query(None),
+    retailer_id: list[str] = Query(None),
+    format: Literal["json", "csv"] = "json",
+    session: AsyncSession = Depends(get_session),
+):
+    """Get total sales grouped by any of agent, retailer, month and day, optionally filtered by date range and IDs"""
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=422, detail="'from' must not be after 'to'")
+    
+    query = sales_report_query(group_by, date_from, date_to, agent_id, retailer_id, session.bind.dialect.name)
+    columns = [c.name for c in query.selected_columns]
+    # Rows go straight from the database cursor to the response, one batch at a time
+    batches = iter_batches(session, query)
+    if format == "csv":
+        return StreamingResponse(stream_csv(columns, batches), media_type="text/csv")
+    meta = {"group_by": list(dict.fromkeys(group_by)), "from": date_from, "to": date_to}
+    return StreamingResponse(stream_json(columns, batches, key="rows", meta=meta), media_type="application/json")
 
 @app.get("/agents")
-def get_all_agents():
-    """Get all agents with their commissions"""
-    session = Session()
-    try:
-        commissions = session.query(Commission).all()
+async def get_all_agents(
+    request: Request,
+    after: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_session),
+):
+    """Get agents with their commissions, one page at a time ordered by agent_id"""
+    async def build():
+        query = select(Commission).order_by(Commission.agent_id)
+        if after is not None:
+            query = query.where(Commission.agent_id > after)
+        commissions = (await session.scalars(query.limit(limit))).all()
         return {
             "agents": [
                 {
@@ -87,24 +212,113 @@ def get_all_agents():
                     "commission_amount": c.commission_amount
                 }
                 for c in commissions
-            ]
+            ],
+            "next_after": commissions[-1].agent_id if len(commissions) == limit else None
         }
-    finally:
-        session.close()
+    
+    return await cache.respond(request, session, build)
 
 @app.get("/retailers")
-def get_all_retailers():
-    """Get all retailers with their sales"""
-    session = Session()
-    try:
-        retailers = session.query(Retailer).all()
-        result = []
-        for r in retailers:
-            total_sales = session.query(func.sum(Transaction.transaction_amount)).filter_by(retailer_id=r.retailer_id).scalar() or 0
-            result.append({
-                "retailer_id": r.retailer_id,
-                "total_sales": total_sales
-            })
-        return {"retailers": result}
-    finally:
-        session.close()
\ No newline at end of file
+async def get_all_retailers(
+    request: Request,
+    after: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_session),
+):
+    """Get retailers with their sales, one page at a time ordered by retailer_id"""
+    async def build():
+        # One query: retailers left-joined to the sales rollup, keyset-paginated
+        query = (
+            select(Retailer.retailer_id, func.coalesce(RetailerSales.total_sales, 0))
+            .outerjoin(RetailerSales, RetailerSales.retailer_id == Retailer.retailer_id)
+            .order_by(Retailer.retailer_id)
+        )
+        if after is not None:
+            query = query.where(Retailer.retailer_id > after)
+        rows = (await session.execute(query.limit(limit))).all()
+        
+        return {
+            "retailers": [
+                {"retailer_id": retailer_id, "total_sales": total_sales}
+                for retailer_id, total_sales in rows
+            ],
+            "next_after": rows[-1][0] if len(rows) == limit else None
+        }
+    
+    return await cache.respond(request, session, build)
+
+# Bulk exports: column -> Arrow type of each exported table, rows fetched per cursor batch
+TRANSACTION_EXPORT_TYPES = {"agent_id": "string", "retailer_id": "string", "transaction_amount": "float64", "date": "date32"}
+COMMISSION_EXPORT_TYPES = {"agent_id": "string", "total_sales": "float64", "commission_rate": "float64",
+                           "commission_amount": "float64"}
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "arrow": "application/vnd.apache.arrow.stream"}
+EXPORT_BATCH_SIZE = 10_000
+# Fastest gzip level: on large exports compression would otherwise dominate the worker's CPU
+EXPORT_GZIP_LEVEL = 1
+
+def export_response(session: AsyncSession, name: str, query, types: dict[str, str], format: str,
+                    gzip: bool) -> StreamingResponse:
+    """Stream the query's rows as an NDJSON, CSV or Arrow IPC attachment, in constant memory"""
+    if format == "arrow" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Arrow export requires pyarrow: pip install pyarrow")
+    
+    batches = iter_batches(session, query, EXPORT_BATCH_SIZE)
+    if format == "arrow":
+        body = stream_arrow(types, batches)
+    elif format == "csv":
+        body = stream_csv(list(types), batches)
+    else:
+        body = stream_ndjson(list(types), batches)
+    
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+    if gzip:
+        body = gzip_stream(body, EXPORT_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[format], headers=headers)
+
+@app.get("/export/transactions")
+async def export_transactions(
+    date_from: date = Query(None, alias="from"),
+    date_to: date = Query(None, alias="to"),
+    agent_id: list[str] = Query(None),
+    retailer_id: list[str] = Query(None),
+    format: Literal["ndjson", "csv", "arrow"] = "ndjson",
+    gzip: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    """Export transactions in load order, optionally limited to a date range and agents/retailers"""
+    # Dates go out as stored: SQLite keeps ISO text, so skip parsing it into date objects per row
+    query = select(Transaction.agent_id, Transaction.retailer_id, Transaction.transaction_amount,
+                   type_coerce(Transaction.date, String).label("date")).order_by(Transaction.id)
+    if date_from is not None:
+        query = query.where(Transaction.date >= date_from)
+    if date_to is not None:
+        query = query.where(Transaction.date <= date_to)
+    if agent_id:
+        query = query.where(Transaction.agent_id.in_(agent_id))
+    if retailer_id:
+        query = query.where(Transaction.retailer_id.in_(retailer_id))
+    return export_response(session, "transactions", query, TRANSACTION_EXPORT_TYPES, format, gzip)
+
+@app.get("/export/commissions")
+async def export_commissions(
+    agent_id: list[str] = Query(None),
+    format: Literal["ndjson", "csv", "arrow"] = "ndjson",
+    gzip: bool = False,
+    session: AsyncSession = Depends(get_session),
+):
+    """Export every agent's commission ordered by agent_id"""
+    query = select(*[getattr(Commission, column) for column in COMMISSION_EXPORT_TYPES]).order_by(Commission.agent_id)
+    if agent_id:
+        query = query.where(Commission.agent_id.in_(agent_id))
+    return export_response(session, "commissions", query, COMMISSION_EXPORT_TYPES, format, gzip)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Get stage and request timings in the Prometheus text format"""
+    return PlainTextResponse(metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Get response cache hit/miss counters"""
+    return cache.stats()
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Iterable
+
+# Rows fetched from the database cursor and serialized per response chunk
+STREAM_BATCH_SIZE = 1000
+
+# One shared encoder: json.dumps with non-default options builds a new encoder on every call
+encode_json = json.JSONEncoder(default=str).encode
+
+async def iter_batches(session, query, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[list]:
+    """Execute query on a server-side cursor and yield its rows batch_size at a time"""
+    # Core execution on the session's connection skips the ORM's per-row loading overhead
+    connection = await session.connection()
+    result = await connection.stream(query.execution_options(yield_per=batch_size))
+    async for batch in result.partitions():
+        yield batch
+
+async def stream_json(columns: list[str], batches: AsyncIterator[list], key: str = "rows",
+                      meta: dict = None) -> AsyncIterator[str]:
+    """Serialize row batches as one JSON object {**meta, key: [{column: value}, ...]} without building it in memory"""
+    head = encode_json(meta or {})[:-1]
+    yield f"{head}{', ' if meta else ''}\"{key}\": ["
+    first = True
+    async for batch in batches:
+        if not batch:
+            continue
+        chunk = ", ".join(encode_json(dict(zip(columns, row))) for row in batch)
+        yield chunk if first else ", " + chunk
+        first = False
+    yield "]}"
+
+async def stream_csv(columns: list[str], batches: AsyncIterator[list]) -> AsyncIterator[str]:
+    """Serialize row batches as CSV with a header line"""
+    yield encode_csv([columns])
+    async for batch in batches:
+        yield encode_csv(batch)
+
+async def stream_ndjson(columns: list[str], batches: AsyncIterator[list]) -> AsyncIterator[str]:
+    """Serialize row batches as newline-delimited JSON objects"""
+    async for batch in batches:
+        if batch:
+            yield "".join(encode_json(dict(zip(columns, row))) + "\n" for row in batch)
+
+async def stream_arrow(types: dict[str, str], batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    """Serialize row batches as an Arrow IPC stream; types maps each column to a pyarrow type name, e.g. float64"""
+    import pyarrow as pa
+    
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in types.items()])
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    async for batch in batches:
+        if not batch:
+            continue
+        # Cast rather than convert, so ISO date strings and date objects both become date32
+        arrays = [pa.array(values).cast(field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield drain(sink)
+    writer.close()
+    yield drain(sink)
+
+async def gzip_stream(chunks: AsyncIterator, level: int = 6) -> AsyncIterator[bytes]:
+    """Gzip a stream of str or bytes chunks on the fly"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def drain(buffer: io.BytesIO) -> bytes:
+    """Return everything written to buffer so far and empty it"""
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+def encode_csv(rows: Iterable) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
@@ -0,0 +1,83 @@
+import os
+import uuid
+import pandas as pd
+
+# pyarrow is optional: it is only imported when a columnar file is read or written
+COLUMNAR_FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+}
+INPUT_COLUMNS = ["agent_id", "retailer_id", "transaction_amount", "date"]
+
+def input_format(file_path: str) -> str:
+    """Return 'csv', 'parquet' or 'feather' based on the file extension"""
+    return COLUMNAR_FORMATS.get(os.path.splitext(file_path)[1].lower(), "csv")
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("Reading or staging Parquet/Arrow files requires pyarrow: pip install pyarrow") from e
+
+def file_columns(file_path: str, fmt: str) -> list[str]:
+    """Column names of a Parquet or Feather/Arrow IPC file, read from its schema without loading data"""
+    pa = _pyarrow()
+    if fmt == "parquet":
+        return pa.parquet.read_schema(file_path, memory_map=True).names
+    return pa.ipc.open_file(pa.memory_map(file_path, "r")).schema.names
+
+def open_table(file_path: str, fmt: str, columns: list[str] = None):
+    """Open a Parquet or Feather/Arrow IPC file as a memory-mapped pyarrow Table"""
+    pa = _pyarrow()
+    if fmt == "parquet":
+        return pa.parquet.read_table(file_path, columns=columns, memory_map=True)
+    # Uncompressed Arrow IPC buffers are used in place, without copying
+    table = pa.ipc.open_file(pa.memory_map(file_path, "r")).read_all()
+    return table.select(columns) if columns else table
+
+def iter_batches(file_path: str, fmt: str, batch_size: int, columns: list[str] = None):
+    """Yield record batches of at most batch_size rows from a Parquet or Feather/Arrow IPC file"""
+    pa = _pyarrow()
+    if fmt == "parquet":
+        # Decodes one row group at a time instead of the whole file
+        yield from pa.parquet.ParquetFile(file_path, memory_map=True).iter_batches(batch_size=batch_size, columns=columns)
+        return
+    reader = pa.ipc.open_file(pa.memory_map(file_path, "r"))
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        batch = batch.select(columns) if columns else batch
+        # Slices are zero-copy views of the memory-mapped batch
+        for start in range(0, batch.num_rows, batch_size):
+            yield batch.slice(start, batch_size)
+
+def stage_batch(df: pd.DataFrame, root: str):
+    """Append a validated batch to a Parquet dataset under root, partitioned as month=YYYY-MM"""
+    from src.ingestion.reader import transaction_amounts
+    
+    pa = _pyarrow()
+    staged = pd.DataFrame({
+        "agent_id": df["agent_id"],
+        "retailer_id": df["retailer_id"],
+        "transaction_amount": transaction_amounts(df),
+        "date": df["date"],
+        "month": pd.to_datetime(df["date"]).dt.strftime("%Y-%m"),
+    })
+    pa.parquet.write_to_dataset(
+        pa.Table.from_pandas(staged, preserve_index=False),
+        root,
+        partition_cols=["month"],
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+    )
+
+def read_staged(root: str, columns: list[str] = None, months: list[str] = None) -> pd.DataFrame:
+    """Read a staged dataset, loading only the requested columns and month partitions"""
+    pa = _pyarrow()
+    dataset = pa.dataset.dataset(root, format="parquet", partitioning="hive")
+    month_filter = pa.dataset.field("month").isin(months) if months else None
+    return dataset.to_table(columns=columns, filter=month_filter).to_pandas()
@@ -1,11 +1,143 @@
 import pandas as pd
+import hashlib
+import io
 import os
+from contextlib import contextmanager
+from typing import Iterator
+from src.ingestion.columnar import INPUT_COLUMNS, file_columns, input_format, iter_batches, open_table
+from src.ingestion.schema import Schema
 from src.utils.logger import setup_logger
+from src.utils.metrics import instrument, timed
+
+REJECTS_PATH = "logs/rejected_rows.log"
+
+# Bytes hashed at each end of an already-ingested prefix when fingerprinting a file
+FINGERPRINT_WINDOW = 64 * 1024
+
+class _ByteRange(io.RawIOBase):
+    """Read-only view over bytes [start, end) of a file"""
+    
+    def __init__(self, file_path: str, start: int, end: int):
+        self._file = open(file_path, "rb")
+        self._file.seek(start)
+        self._remaining = max(end - start, 0)
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer)[:self._remaining]
+        read = self._file.readinto(view)
+        self._remaining -= read
+        return read
+    
+    def close(self):
+        self._file.close()
+        super().close()
+
+def transaction_amounts(df: pd.DataFrame) -> pd.Series:
+    """Transaction amounts in currency units, whether the frame stores them as floats or integer cents"""
+    if "amount_cents" in df.columns:
+        return df["amount_cents"] / 100
+    return df["transaction_amount"]
+
+def compact(df: pd.DataFrame, amounts_in_cents: bool = False) -> pd.DataFrame:
+    """Convert validated rows to the compact schema: categorical IDs, second-resolution dates, optional cents"""
+    df = df.assign(
+        agent_id=df["agent_id"].astype("category"),
+        retailer_id=df["retailer_id"].astype("category"),
+        date=df["date"].astype("datetime64[s]"),
+    )
+    if amounts_in_cents:
+        # Integer cents sum exactly, unlike float dollars
+        cents = (df["transaction_amount"] * 100).round().astype("int64")
+        df = df.drop(columns="transaction_amount").assign(amount_cents=cents)
+    return df
 
 class DataReader:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, start_offset: int = 0, end_offset: int = None,
+                 compact: bool = True, amounts_in_cents: bool = False, rejects_path: str = None,
+                 schema: Schema = None, first_row: int = 0):
+        """Read file_path, optionally only the bytes [start_offset, end_offset) appended since a previous run
+        
+        first_row is the number of data rows before start_offset, so rows are numbered as in the whole file.
+        """
         self.file_path = file_path
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.first_row = first_row
+        # Raw rows (valid and rejected) returned by the last read() or iter_chunks()
+        self.rows_read = 0
+        self.compact = compact
+        self.amounts_in_cents = amounts_in_cents
+        self.rejects_path = rejects_path or REJECTS_PATH
+        self.schema = schema or Schema.load()
+        # Failing rows per validation rule across every batch this reader validated
+        self.rule_counts = {}
+        self.format = input_format(file_path)
         self.logger = setup_logger("ingestion", "logs/pipeline.log")
+        
+        if self.format != "csv" and start_offset:
+            raise ValueError(f"Byte ranges are only supported for CSV input: {file_path}")
+    
+    def content_hash(self, offset: int) -> str:
+        """Fingerprint the first offset bytes: size plus the head and tail windows of that prefix"""
+        digest = hashlib.sha256(str(offset).encode())
+        with open(self.file_path, "rb") as f:
+            digest.update(f.read(min(offset, FINGERPRINT_WINDOW)))
+            tail_start = max(offset - FINGERPRINT_WINDOW, FINGERPRINT_WINDOW)
+            if tail_start < offset:
+                f.seek(tail_start)
+                digest.update(f.read(offset - tail_start))
+        return digest.hexdigest()
+    
+    def complete_end(self, offset: int = 0) -> int:
+        """Byte offset just past the last newline after offset, so an unterminated last line waits for the next run"""
+        end = os.path.getsize(self.file_path)
+        if self.format != "csv":
+            return end
+        with open(self.file_path, "rb") as f:
+            while end > offset:
+                start = max(end - FINGERPRINT_WINDOW, offset)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    return start + newline + 1
+                end = start
+        return offset
+    
+    def rows_before(self, offset: int) -> int:
+        """Count the data rows before a byte offset from its newlines, for ledgers that did not record them"""
+        newlines = 0
+        with open(self.file_path, "rb") as f:
+            for start in range(0, offset, FINGERPRINT_WINDOW):
+                newlines += f.read(min(FINGERPRINT_WINDOW, offset - start)).count(b"\n")
+        # The first line is the header
+        return max(newlines - 1, 0)
+    
+    def _number_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Index a raw frame by each row's position among the file's data rows, so source_row is exact"""
+        start = self.first_row + self.rows_read
+        df.index = pd.RangeIndex(start, start + len(df))
+        self.rows_read += len(df)
+        return df
+    
+    @contextmanager
+    def _csv_source(self):
+        """Yield (source, read_csv kwargs) covering the configured byte range of the file"""
+        if not self.start_offset and self.end_offset is None:
+            yield self.file_path, {}
+            return
+        
+        end_offset = self.end_offset if self.end_offset is not None else os.path.getsize(self.file_path)
+        kwargs = {}
+        if self.start_offset:
+            # The header only exists at the start of the file
+            names = pd.read_csv(self.file_path, nrows=0).columns.tolist()
+            kwargs = {"names": names, "header": None}
+        
+        with io.BufferedReader(_ByteRange(self.file_path, self.start_offset, end_offset)) as source:
+            yield source, kwargs
     
     def read_csv(self) -> pd.DataFrame:
         """Read CSV file and return raw dataframe"""
@@ -16,49 +148,111 @@ class DataReader:
             raise FileNotFoundError(f"File not found: {self.file_path}")
         
         try:
-            df = pd.read_csv(self.file_path)
+            with self._csv_source() as (source, kwargs):
+                df = pd.read_csv(source, **kwargs)
             self.logger.info(f"Successfully read {len(df)} rows from file")
-            return df
+            self.rows_read = 0
+            return self._number_rows(df)
         except Exception as e:
             self.logger.error(f"Error reading file: {e}")
             raise
     
-    def validate(self, df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
-        """Validate data and return (valid_df, invalid_df)"""
-        self.logger.info("Starting data validation")
-        invalid_mask = pd.Series([False] * len(df))
+    def _input_columns(self) -> list[str]:
+        """The INPUT_COLUMNS present in a Parquet or Feather input; other columns are never read"""
+        if not os.path.exists(self.file_path):
+            self.logger.error(f"File not found: {self.file_path}")
+            raise FileNotFoundError(f"File not found: {self.file_path}")
+        
+        present = set(file_columns(self.file_path, self.format))
+        return [c for c in INPUT_COLUMNS if c in present]
+    
+    def _open_table(self):
+        """Open a Parquet or Feather input memory-mapped, reading only the input columns"""
+        return open_table(self.file_path, self.format, self._input_columns())
+    
+    @instrument("ingestion.read")
+    def read(self) -> pd.DataFrame:
+        """Read the input as a raw dataframe, in the format given by its extension"""
+        if self.format == "csv":
+            return self.read_csv()
+        
+        self.logger.info(f"Reading {self.format} file: {self.file_path}")
+        try:
+            df = self._open_table().to_pandas()
+            self.logger.info(f"Successfully read {len(df)} rows from file")
+            self.rows_read = 0
+            return self._number_rows(df)
+        except Exception as e:
+            self.logger.error(f"Error reading file: {e}")
+            raise
+    
+    def iter_chunks(self, chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+        """Read the input lazily and yield raw dataframes of at most chunksize rows"""
+        self.logger.info(f"Streaming file: {self.file_path} (chunksize={chunksize})")
         
-        # Check for missing agent_id
-        invalid_mask = invalid_mask | df["agent_id"].isna()
+        if not os.path.exists(self.file_path):
+            self.logger.error(f"File not found: {self.file_path}")
+            raise FileNotFoundError(f"File not found: {self.file_path}")
         
-        # Check for missing retailer_id
-        invalid_mask = invalid_mask | df["retailer_id"].isna()
+        self.rows_read = 0
+        if self.format != "csv":
+            for batch in iter_batches(self.file_path, self.format, chunksize, self._input_columns()):
+                yield self._number_rows(batch.to_pandas())
+            return
         
-        # Check for missing or non-numeric transaction_amount
-        invalid_mask = invalid_mask | df["transaction_amount"].isna()
-        invalid_mask = invalid_mask | ~pd.to_numeric(df["transaction_amount"], errors="coerce").notna()
+        try:
+            with self._csv_source() as (source, kwargs):
+                with pd.read_csv(source, chunksize=chunksize, **kwargs) as chunks:
+                    for chunk in chunks:
+                        yield self._number_rows(chunk)
+        except Exception as e:
+            self.logger.error(f"Error reading file: {e}")
+            raise
+    
+    @instrument("ingestion.validate")
+    def validate(self, df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Validate data and return (valid_df, invalid_df); invalid_df gets a reject_reason column"""
+        self.logger.info("Starting data validation")
         
-        # Check for missing date
-        invalid_mask = invalid_mask | df["date"].isna()
+        # All column conversions and rules in one pass; a row is rejected with the first reason it fails
+        parsed, reasons, rule_counts = self.schema.evaluate(df)
+        invalid_mask = pd.Series(reasons != "", index=df.index)
         
         valid_df = df[~invalid_mask].copy()
         invalid_df = df[invalid_mask].copy()
-
+        invalid_df["reject_reason"] = reasons[invalid_mask.to_numpy()]
+        self.rule_counts = {rule: self.rule_counts.get(rule, 0) + count for rule, count in rule_counts.items()}
+        
         # Convert transaction_amount to numeric for valid rows
-        valid_df["transaction_amount"] = pd.to_numeric(valid_df["transaction_amount"])
+        valid_df["transaction_amount"] = parsed["transaction_amount"][~invalid_mask]
         
-        self.logger.info(f"Validation complete: {len(valid_df)} valid, {len(invalid_df)} invalid")
+        # Keep the parsed dates so later stages never re-parse them
+        valid_df["date"] = parsed["date"][~invalid_mask]
+        if self.compact:
+            valid_df = compact(valid_df, self.amounts_in_cents)
+        
+        self.logger.info(f"Validation complete: {len(valid_df)} valid, {len(invalid_df)} invalid; "
+                         f"failing rows per rule: {({r: c for r, c in rule_counts.items() if c})}")
         return valid_df, invalid_df
     
+    @instrument("ingestion.log_rejected")
     def log_rejected(self, invalid_df: pd.DataFrame):
-        """Log each rejected row"""
-        for index, row in invalid_df.iterrows():
-            self.logger.warning(f"Rejected row {index}: {row.to_dict()}")
+        """Append rejected rows to the rejects sink as JSON lines and log one summary line"""
+        rejects = invalid_df.assign(source_file=self.file_path, source_row=invalid_df.index)
+        os.makedirs(os.path.dirname(self.rejects_path) or ".", exist_ok=True)
+        lines = rejects.to_json(orient="records", lines=True, date_format="iso")
+        with open(self.rejects_path, "a") as f:
+            f.write(lines if lines.endswith("\n") else lines + "\n")
+        
+        counts = invalid_df["reject_reason"].value_counts().to_dict()
+        self.logger.warning(f"Rejected {len(invalid_df)} rows from {self.file_path} "
+                            f"(see {self.rejects_path}): {counts}")
     
+    @instrument("ingestion.ingest")
     def ingest(self) -> pd.DataFrame:
         """Main method: read, validate, log rejected, return valid data"""
         try:
-            df = self.read_csv()
+            df = self.read()
             valid_df, invalid_df = self.validate(df)
             
             if not invalid_df.empty:
@@ -68,4 +262,33 @@ class DataReader:
             return valid_df
         except Exception as e:
             self.logger.error(f"Ingestion failed: {e}")
-            raise
\ No newline at end of file
+            raise
+    
+    def ingest_stream(self, chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+        """Streaming variant of ingest: yield validated batches without loading the whole file"""
+        total_valid = 0
+        total_invalid = 0
+        try:
+            chunks = self.iter_chunks(chunksize)
+            while True:
+                # Time parsing each chunk separately from validating it
+                with timed("ingestion.read") as timer:
+                    chunk = next(chunks, None)
+                    timer.rows = 0 if chunk is None else len(chunk)
+                if chunk is None:
+                    break
+                valid_df, invalid_df = self.validate(chunk)
+                
+                if not invalid_df.empty:
+                    self.log_rejected(invalid_df)
+                
+                total_valid += len(valid_df)
+                total_invalid += len(invalid_df)
+                if not valid_df.empty:
+                    yield valid_df
+            
+            self.logger.info(f"Streaming ingestion complete: {total_valid} valid, {total_invalid} invalid rows; "
+                             f"failing rows per rule: {({r: c for r, c in self.rule_counts.items() if c})}")
+        except Exception as e:
+            self.logger.error(f"Ingestion failed: {e}")
+            raise
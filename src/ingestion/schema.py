@@ -0,0 +1,123 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+DEFAULT_SCHEMA_PATH = "config/transaction_schema.json"
+
+# Plain decimal or scientific notation (surrounding whitespace allowed); anything else, inf included, is invalid
+NUMBER_PATTERN = r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?"
+
+def to_number(values: pd.Series) -> pd.Series:
+    """Parse a column as float64, NaN where unparseable; Arrow-backed strings avoid the slow pd.to_numeric path"""
+    if isinstance(values.dtype, pd.StringDtype) and values.dtype.storage == "pyarrow":
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        strings = pc.utf8_trim_whitespace(pa.array(values.array))
+        numeric = pc.match_substring_regex(strings, f"^(?:{NUMBER_PATTERN})$")
+        parsed = pc.cast(pc.if_else(numeric, strings, pa.scalar(None, pa.string())), pa.float64())
+        return pd.Series(parsed.to_numpy(zero_copy_only=False), index=values.index)
+    return pd.to_numeric(values, errors="coerce")
+
+class ColumnRule:
+    """Contract for one input column: its type, whether it is required, and an optional format or range"""
+
+    def __init__(self, name: str, dtype: str = "string", label: str = None, required: bool = True,
+                 pattern: str = None, min_value=None, max_value=None, min_exclusive: bool = False,
+                 date_format: str = "ISO8601"):
+        if dtype not in ("string", "number", "date"):
+            raise ValueError(f"Unknown type for column {name}: {dtype}")
+        self.name = name
+        self.dtype = dtype
+        self.label = label or name
+        self.required = required
+        self.pattern = pattern
+        self.min_exclusive = min_exclusive
+        self.date_format = date_format
+        if dtype == "date":
+            min_value = pd.Timestamp(min_value) if min_value is not None else None
+            max_value = pd.Timestamp(max_value) if max_value is not None else None
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def parse(self, values: pd.Series) -> pd.Series:
+        """Convert the column once; unparseable values become NaN/NaT"""
+        if self.dtype == "number":
+            return to_number(values)
+        if self.dtype == "date":
+            if pd.api.types.is_datetime64_any_dtype(values):
+                return values
+            return pd.to_datetime(values, format=self.date_format, errors="coerce")
+        return values
+
+    def checks(self, values: pd.Series, parsed: pd.Series) -> dict[str, pd.Series]:
+        """Failure masks for this column's rules, in priority order, keyed by reject reason"""
+        missing = values.isna()
+        checks = {}
+        if self.required:
+            checks[f"missing_{self.label}"] = missing
+        if self.dtype != "string":
+            checks[f"invalid_{self.label}"] = parsed.isna() & ~missing
+        if self.pattern is not None:
+            checks[f"invalid_{self.label}_format"] = ~values.astype("str").str.fullmatch(self.pattern).fillna(False) & ~missing
+        if self.min_value is not None or self.max_value is not None:
+            out_of_range = pd.Series(False, index=values.index)
+            if self.min_value is not None:
+                out_of_range = parsed <= self.min_value if self.min_exclusive else parsed < self.min_value
+            if self.max_value is not None:
+                out_of_range = out_of_range | (parsed > self.max_value)
+            checks[f"{self.label}_out_of_range"] = out_of_range
+        return checks
+
+class Schema:
+    """Declarative contract for input rows, evaluated over a whole frame in one vectorized pass"""
+
+    def __init__(self, columns: list[ColumnRule]):
+        if not columns:
+            raise ValueError("A schema needs at least one column")
+        self.columns = columns
+
+    @classmethod
+    def default(cls) -> "Schema":
+        """Transactions contract: A/R-prefixed IDs, positive amounts, ISO dates"""
+        return cls([
+            ColumnRule("agent_id", pattern=r"A\d+"),
+            ColumnRule("retailer_id", pattern=r"R\d+"),
+            ColumnRule("transaction_amount", "number", label="amount", min_value=0, min_exclusive=True),
+            ColumnRule("date", "date"),
+        ])
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_SCHEMA_PATH) -> "Schema":
+        """Load the contract from a JSON config file, falling back to the default if it does not exist"""
+        if not os.path.exists(path):
+            return cls.default()
+        with open(path) as f:
+            config = json.load(f)
+        return cls([ColumnRule(**column) for column in config["columns"]])
+
+    def evaluate(self, df: pd.DataFrame) -> tuple[dict[str, pd.Series], np.ndarray, dict[str, int]]:
+        """Return (parsed columns, reject reason per row or "" if valid, failing rows per rule)
+
+        Each column is converted once. A row fails every rule it breaks in the counts, but is
+        rejected with the first reason in column order.
+        """
+        missing_columns = [c.name for c in self.columns if c.name not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Input is missing required columns: {missing_columns}")
+
+        parsed = {}
+        checks = {}
+        for column in self.columns:
+            parsed[column.name] = column.parse(df[column.name])
+            checks.update(column.checks(df[column.name], parsed[column.name]))
+
+        # Small integer codes instead of per-row strings; lower-priority rules are overwritten by earlier ones
+        codes = np.zeros(len(df), dtype="int8")
+        counts = {}
+        for code, (reason, mask) in reversed(list(enumerate(checks.items(), start=1))):
+            mask = mask.to_numpy(dtype=bool, na_value=False)
+            counts[reason] = int(mask.sum())
+            codes[mask] = code
+        reasons = np.array([""] + list(checks), dtype=object)[codes]
+        return parsed, reasons, dict(reversed(counts.items()))
@@ -1,39 +1,89 @@
+import numpy as np
 import pandas as pd
+from datetime import date
+from src.processing.commission import CommissionRules
+from src.utils.metrics import instrument, timed
 
 class DataAggregator:
     def __init__(self, df: pd.DataFrame):
         self.df = df
+        self._totals = None
+    
+    def _compute_totals(self) -> dict[str, pd.DataFrame]:
+        """Compute every total in one pass over the frame and cache the results"""
+        if self._totals is not None:
+            return self._totals
+        
+        with timed("aggregation.totals", rows=len(self.df)):
+            if "amount_cents" in self.df.columns:
+                # Integer cents stay exact in float64 sums up to 2**53 cents
+                amounts, scale = self.df["amount_cents"].to_numpy(dtype="float64"), 100
+            else:
+                amounts, scale = self.df["transaction_amount"].to_numpy(dtype="float64"), 1
+            dates = self.df["date"]
+            if not pd.api.types.is_datetime64_any_dtype(dates):
+                # Ingestion already parses dates; only raw frames pay for parsing here
+                dates = pd.to_datetime(dates)
+            months = dates.to_numpy().astype("datetime64[M]")
+            
+            self._totals = {}
+            for key, values in (("agent_id", self.df["agent_id"]), ("retailer_id", self.df["retailer_id"]), ("month", months)):
+                # Factorize each key once (free for categoricals) and sum with bincount
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+                else:
+                    codes, uniques = pd.factorize(values, sort=True)
+                weights = amounts
+                if len(codes) and codes.min() < 0:
+                    present = codes >= 0
+                    codes, weights = codes[present], amounts[present]
+                totals = np.bincount(codes, weights=weights, minlength=len(uniques)).astype("float64") / scale
+                observed = np.bincount(codes, minlength=len(uniques)) > 0
+                if key == "month":
+                    uniques = pd.DatetimeIndex(uniques).to_period("M")
+                result = pd.DataFrame({key: uniques[observed], "total_sales": totals[observed]})
+                if not result[key].is_monotonic_increasing:
+                    result = result.sort_values(key, ignore_index=True)
+                self._totals[key] = result
+        return self._totals
     
     def sales_by_agent(self) -> pd.DataFrame:
         """Group by agent_id and sum transaction_amount"""
-        result = self.df.groupby("agent_id")["transaction_amount"].sum().reset_index()
-        result.columns = ["agent_id", "total_sales"]
-        return result
+        return self._compute_totals()["agent_id"].copy()
     
     def sales_by_retailer(self) -> pd.DataFrame:
         """Group by retailer_id and sum transaction_amount"""
-        result = self.df.groupby("retailer_id")["transaction_amount"].sum().reset_index()
-        result.columns = ["retailer_id", "total_sales"]
-        return result
+        return self._compute_totals()["retailer_id"].copy()
     
     def monthly_totals(self) -> pd.DataFrame:
         """Extract month from date and sum transaction_amount by month"""
-        df_copy = self.df.copy()
-        df_copy["month"] = pd.to_datetime(df_copy["date"]).dt.to_period("M")
-        result = df_copy.groupby("month")["transaction_amount"].sum().reset_index()
-        result.columns = ["month", "total_sales"]
+        return self._compute_totals()["month"].copy()
+    
+    def calculate_commission(self, rules: CommissionRules = None) -> pd.DataFrame:
+        """Calculate commission with the configured tier plans (default: 5% below 5000, 8% from 5000)"""
+        rules = rules or CommissionRules.load()
+        return self.apply_commission(self.sales_by_agent(), rules, self.period_end(self.monthly_totals()))
+    
+    @staticmethod
+    def merge_totals(partials: list[pd.DataFrame], key: str) -> pd.DataFrame:
+        """Combine partial (key, total_sales) frames, e.g. one per batch, into a single total per key"""
+        partials = [p for p in partials if not p.empty]
+        if not partials:
+            return pd.DataFrame({key: [], "total_sales": []})
+        combined = pd.concat(partials, ignore_index=True)
+        result = combined.groupby(key, observed=True)["total_sales"].sum().reset_index()
+        result.columns = [key, "total_sales"]
         return result
     
-    def calculate_commission(self) -> pd.DataFrame:
-        """Calculate commission: 5% if sales < 5000, 8% if sales >= 5000"""
-        agent_sales = self.sales_by_agent()
-        
-        # Apply commission rate based on sales
-        agent_sales["commission_rate"] = agent_sales["total_sales"].apply(
-            lambda x: 0.08 if x >= 5000 else 0.05
-        )
-        
-        # Calculate commission amount
-        agent_sales["commission_amount"] = agent_sales["total_sales"] * agent_sales["commission_rate"]
-        
-        return agent_sales
\ No newline at end of file
+    @staticmethod
+    def period_end(monthly_totals: pd.DataFrame) -> date:
+        """Last day of the latest month with sales, the date commission plans are chosen for; None without sales"""
+        if monthly_totals.empty:
+            return None
+        return monthly_totals["month"].max().end_time.date()
+    
+    @staticmethod
+    @instrument("aggregation.commission")
+    def apply_commission(agent_sales: pd.DataFrame, rules: CommissionRules, as_of: date = None) -> pd.DataFrame:
+        """Add commission_rate and commission_amount to an (agent_id, total_sales) frame with the plans active on as_of"""
+        return rules.apply(agent_sales, as_of)
@@ -0,0 +1,97 @@
+import json
+import os
+from datetime import date
+import numpy as np
+import pandas as pd
+
+DEFAULT_PLANS_PATH = "config/commission_plans.json"
+
+class CommissionPlan:
+    """Tiered commission plan: flat applies the reached tier's rate to all sales, marginal only to the part in each tier"""
+    
+    def __init__(self, name: str, tiers: list[dict], mode: str = "flat", region: str = None,
+                 valid_from: str = None, valid_to: str = None):
+        if mode not in ("flat", "marginal"):
+            raise ValueError(f"Unknown commission mode for plan {name}: {mode}")
+        tiers = sorted(tiers, key=lambda t: t["min_sales"])
+        if not tiers or tiers[0]["min_sales"] != 0:
+            raise ValueError(f"Commission plan {name} must have a tier starting at 0")
+        
+        self.name = name
+        self.mode = mode
+        self.region = region
+        self.valid_from = date.fromisoformat(valid_from) if valid_from else date.min
+        self.valid_to = date.fromisoformat(valid_to) if valid_to else date.max
+        self.thresholds = np.array([t["min_sales"] for t in tiers], dtype="float64")
+        self.rates = np.array([t["rate"] for t in tiers], dtype="float64")
+        # Commission earned on reaching each threshold, used by marginal plans
+        self.base = np.concatenate(([0.0], np.cumsum(np.diff(self.thresholds) * self.rates[:-1])))
+    
+    def is_active(self, as_of: date) -> bool:
+        return self.valid_from <= as_of <= self.valid_to
+    
+    def evaluate(self, sales: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return (commission_rate, commission_amount) for an array of total sales"""
+        tier = np.maximum(np.searchsorted(self.thresholds, sales, side="right") - 1, 0)
+        if self.mode == "flat":
+            rate = self.rates[tier]
+            return rate, sales * rate
+        
+        amount = self.base[tier] + (sales - self.thresholds[tier]) * self.rates[tier]
+        rate = np.divide(amount, sales, out=np.zeros_like(amount), where=sales != 0)
+        return rate, amount
+
+class CommissionRules:
+    """Set of commission plans selected per agent by region and by the period they are valid in"""
+    
+    def __init__(self, plans: list[CommissionPlan]):
+        if not plans:
+            raise ValueError("At least one commission plan is required")
+        self.plans = plans
+    
+    @classmethod
+    def default(cls) -> "CommissionRules":
+        """5% below 5000 in sales, 8% from 5000 on"""
+        return cls([CommissionPlan("standard", [{"min_sales": 0, "rate": 0.05}, {"min_sales": 5000, "rate": 0.08}])])
+    
+    @classmethod
+    def load(cls, path: str = DEFAULT_PLANS_PATH) -> "CommissionRules":
+        """Load plans from a JSON config file, falling back to the default plan if it does not exist"""
+        if not os.path.exists(path):
+            return cls.default()
+        with open(path) as f:
+            config = json.load(f)
+        return cls([CommissionPlan(**plan) for plan in config["plans"]])
+    
+    def plan_for(self, region: str = None, as_of: date = None) -> CommissionPlan:
+        """First active plan for the region, else the first active plan without a region"""
+        as_of = as_of or date.today()
+        active = [p for p in self.plans if p.is_active(as_of)]
+        for plan in active:
+            if region is not None and plan.region == region:
+                return plan
+        for plan in active:
+            if plan.region is None:
+                return plan
+        raise ValueError(f"No commission plan active on {as_of} for region {region}")
+    
+    def apply(self, agent_sales: pd.DataFrame, as_of: date = None) -> pd.DataFrame:
+        """Add commission_rate and commission_amount to an (agent_id, total_sales[, region]) frame"""
+        result = agent_sales.copy()
+        sales = result["total_sales"].to_numpy(dtype="float64")
+        rates = np.zeros(len(result))
+        amounts = np.zeros(len(result))
+        
+        if "region" in result.columns:
+            regions = result["region"].astype(object).where(result["region"].notna(), None)
+            groups = {region: (regions == region).to_numpy() for region in pd.unique(regions)}
+        else:
+            groups = {None: np.ones(len(result), dtype=bool)}
+        
+        # One vectorized evaluation per plan, not per agent
+        for region, mask in groups.items():
+            rates[mask], amounts[mask] = self.plan_for(region, as_of).evaluate(sales[mask])
+        
+        result["commission_rate"] = rates
+        result["commission_amount"] = amounts
+        return result
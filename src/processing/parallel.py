@@ -0,0 +1,54 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+from src.ingestion.columnar import COLUMNAR_FORMATS
+from src.ingestion.reader import DataReader
+from src.ingestion.schema import Schema
+from src.processing.aggregator import DataAggregator
+from src.utils.logger import init_worker_logging
+
+def resolve_inputs(path: str) -> list[str]:
+    """Expand a file, directory (CSV/Parquet/Arrow files below it) or glob pattern into a sorted list of files"""
+    if os.path.isdir(path):
+        # Recursive, so a staged month=YYYY-MM/ Parquet dataset can be read back file by file
+        suffixes = (".csv", *COLUMNAR_FORMATS)
+        files = [f for f in glob.glob(os.path.join(path, "**", "*"), recursive=True)
+                 if f.lower().endswith(suffixes)]
+    elif glob.has_magic(path):
+        files = glob.glob(path)
+    else:
+        return [path]
+    
+    if not files:
+        raise FileNotFoundError(f"No input files match: {path}")
+    return sorted(files)
+
+def ingest_partial(file_path: str, start_offset: int = 0, end_offset: int = None, schema: Schema = None,
+                   first_row: int = 0) -> dict:
+    """Read, validate and pre-aggregate one file; runs inside a worker process"""
+    reader = DataReader(file_path, start_offset=start_offset, end_offset=end_offset, schema=schema,
+                        first_row=first_row)
+    valid_df = reader.ingest()
+    aggregator = DataAggregator(valid_df)
+    return {
+        "file_path": file_path,
+        "data": valid_df,
+        "sales_by_agent": aggregator.sales_by_agent(),
+        "sales_by_retailer": aggregator.sales_by_retailer(),
+        "monthly_totals": aggregator.monthly_totals(),
+        "rule_counts": reader.rule_counts,
+        "rows_read": reader.rows_read,
+    }
+
+def ingest_files(readers: list[DataReader], workers: int = 1) -> Iterator[dict]:
+    """Run ingest_partial for each reader's byte range and schema, yielding results in input order"""
+    tasks = [(r.file_path, r.start_offset, r.end_offset, r.schema, r.first_row) for r in readers]
+    if workers <= 1:
+        for task in tasks:
+            yield ingest_partial(*task)
+        return
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging) as pool:
+        # map() preserves input order, which keeps the merge deterministic
+        yield from pool.map(ingest_partial, *zip(*tasks))
@@ -0,0 +1,65 @@
+import pandas as pd
+from datetime import date
+from sqlalchemy import func, select
+from src.processing.aggregator import DataAggregator
+from src.storage.models import Transaction, month_expr
+from src.utils.metrics import timed
+
+class SqlAggregator(DataAggregator):
+    """DataAggregator over the transactions stored in the database instead of an in-memory frame.
+    
+    Every total is one GROUP BY pushed down to the database and read back in chunks, so
+    re-aggregating the full history needs memory for the results only, not the rows.
+    """
+    
+    def __init__(self, engine, date_from: date = None, date_to: date = None, chunksize: int = 100_000):
+        """Aggregate transactions dated within [date_from, date_to] (inclusive; open if None)"""
+        super().__init__(None)
+        self.engine = engine
+        self.date_from = date_from
+        self.date_to = date_to
+        self.chunksize = chunksize
+        self._totals = {}
+    
+    def _query_totals(self, key: str) -> pd.DataFrame:
+        """Sum transaction_amount per key in SQL; key is agent_id, retailer_id or month"""
+        if key == "month":
+            column = month_expr(Transaction.date, self.engine.dialect.name).label("month")
+        else:
+            column = getattr(Transaction, key)
+        query = select(column, func.sum(Transaction.transaction_amount).label("total_sales"))
+        if self.date_from is not None:
+            query = query.where(Transaction.date >= self.date_from)
+        if self.date_to is not None:
+            query = query.where(Transaction.date <= self.date_to)
+        query = query.group_by(column).order_by(column)
+        
+        with timed(f"aggregation.sql.{key}") as timer, self.engine.connect() as connection:
+            # Server-side cursor: the database holds the rows, only result chunks reach this process
+            result = connection.execution_options(stream_results=True, yield_per=self.chunksize).execute(query)
+            chunks = [pd.DataFrame(rows, columns=[key, "total_sales"]) for rows in result.partitions()]
+            totals = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame({key: [], "total_sales": []})
+            timer.rows = len(totals)
+        
+        totals["total_sales"] = totals["total_sales"].astype("float64")
+        if key == "month":
+            totals["month"] = pd.PeriodIndex(totals["month"], freq="M")
+        return totals
+    
+    def _total(self, key: str) -> pd.DataFrame:
+        """Query one total on first use and cache it; each costs a pass over the table"""
+        if key not in self._totals:
+            self._totals[key] = self._query_totals(key)
+        return self._totals[key].copy()
+    
+    def sales_by_agent(self) -> pd.DataFrame:
+        """Sum transaction_amount by agent_id in the database"""
+        return self._total("agent_id")
+    
+    def sales_by_retailer(self) -> pd.DataFrame:
+        """Sum transaction_amount by retailer_id in the database"""
+        return self._total("retailer_id")
+    
+    def monthly_totals(self) -> pd.DataFrame:
+        """Sum transaction_amount by month in the database"""
+        return self._total("month")
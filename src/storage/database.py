@@ -1,81 +1,470 @@
+import os
 import pandas as pd
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import (
+    Column, Float, MetaData, String, Table, and_, bindparam, case, create_engine, delete, func, insert, inspect,
+    literal, select, text, update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
-from src.storage.models import Base, Agent, Retailer, Transaction, Commission
+from src.storage.models import (
+    Base, Agent, Retailer, Transaction, Commission, IngestionLedger,
+    MonthlySales, RetailerSales, AgentMonthlySales, DataVersion, ADDED_COLUMNS, SUPERSEDED_INDEXES, month_expr,
+)
+from src.ingestion.reader import transaction_amounts
+from src.storage.sqlite_profile import apply_sqlite_profile
+from src.processing.commission import CommissionPlan, CommissionRules
 from src.utils.logger import setup_logger
+from src.utils.metrics import instrument
+
+def commission_exprs(plan: CommissionPlan, total):
+    """SQL (commission_rate, commission_amount) CASE expressions evaluating plan's tiers on a sales column"""
+    tiers = list(zip(plan.thresholds.tolist(), plan.rates.tolist(), plan.base.tolist()))[::-1]
+    if plan.mode == "flat":
+        rate = case(*[(total >= threshold, literal(rate)) for threshold, rate, _ in tiers[:-1]], else_=literal(tiers[-1][1]))
+        return rate, total * rate
+    
+    amount = case(
+        *[(total >= threshold, base + (total - threshold) * rate) for threshold, rate, base in tiers[:-1]],
+        else_=total * tiers[-1][1],
+    )
+    return case((total != 0, amount / total), else_=0.0), amount
+
+# Per-connection scratch table the SQL commission refresh fills before replacing commissions
+commissions_staging = Table(
+    "commissions_staging", MetaData(),
+    Column("agent_id", String, nullable=False),
+    Column("total_sales", Float, nullable=False),
+    Column("commission_rate", Float, nullable=False),
+    Column("commission_amount", Float, nullable=False),
+    prefixes=["TEMPORARY"],
+)
 
 class Database:
-    def __init__(self, db_url: str = "sqlite:///data/pipeline.db"):
+    def __init__(self, db_url: str = "sqlite:///data/pipeline.db", batch_size: int = 10_000, init_schema: bool = False,
+                 sqlite_profile: str = "default"):
+        """sqlite_profile picks the PRAGMAs for SQLite connections, see storage.sqlite_profile.SQLITE_PROFILES"""
+        self.batch_size = batch_size
         self.logger = setup_logger("database", "logs/pipeline.log")
-        self.logger.info(f"Connecting to database: {db_url}")
+        self.logger.info(f"Connecting to database: {db_url} (SQLite profile: {sqlite_profile})")
+        # True while inside transaction(): the save methods then leave committing to it
+        self._in_transaction = False
         
         try:
-            self.engine = create_engine(db_url)
-            Base.metadata.create_all(self.engine)
+            self.engine = apply_sqlite_profile(create_engine(db_url), sqlite_profile)
             Session = sessionmaker(bind=self.engine)
             self.session = Session()
+            if init_schema:
+                self.init_schema()
+            else:
+                self.check_schema()
             self.logger.info("Database connection established")
         except Exception as e:
             self.logger.error(f"Database connection failed: {e}")
             raise
     
+    def init_schema(self):
+        """Create missing tables and indexes and backfill rollups; run once via `main.py init-db`"""
+        Base.metadata.create_all(self.engine)
+        self.ensure_columns()
+        self.ensure_indexes()
+        self._bootstrap_rollups()
+        self.logger.info("Database schema initialized")
+    
+    def check_schema(self):
+        """Fail fast, with a few catalog queries, if init_schema has not been run for this version of the schema"""
+        inspector = inspect(self.engine)
+        missing = set(Base.metadata.tables) - set(inspector.get_table_names())
+        if missing:
+            raise RuntimeError(f"Database is missing tables {sorted(missing)}; run `python main.py init-db` first")
+        for table, names in ADDED_COLUMNS.items():
+            missing = set(names) - {column["name"] for column in inspector.get_columns(table)}
+            if missing:
+                raise RuntimeError(f"Table {table} is missing columns {sorted(missing)}; run `python main.py init-db` first")
+    
+    @contextmanager
+    def transaction(self):
+        """Run several saves as one transaction: a single commit (and fsync) at the end, rollback on error"""
+        if self._in_transaction:
+            yield
+            return
+        
+        self._in_transaction = True
+        try:
+            yield
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+    
+    def _commit(self):
+        """Commit now, unless an enclosing transaction() commits once at its end"""
+        if not self._in_transaction:
+            self.session.commit()
+    
+    def ensure_columns(self):
+        """Add the ADDED_COLUMNS missing from tables created before the column was declared"""
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table, names in ADDED_COLUMNS.items():
+                existing = {column["name"] for column in inspector.get_columns(table)}
+                for name in names:
+                    if name not in existing:
+                        column_type = Base.metadata.tables[table].c[name].type.compile(dialect=self.engine.dialect)
+                        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+                        self.logger.info(f"Added column {table}.{name}")
+    
+    def ensure_indexes(self):
+        """Create model indexes missing from tables that existed before the index was declared, drop superseded ones"""
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=self.engine, checkfirst=True)
+        
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table, names in SUPERSEDED_INDEXES.items():
+                existing = {index["name"] for index in inspector.get_indexes(table)}
+                for name in existing.intersection(names):
+                    connection.execute(text(f"DROP INDEX {name}"))
+                    self.logger.info(f"Dropped superseded index {name}")
+    
+    def _dialect_insert(self, table):
+        """Return a dialect-specific INSERT supporting ON CONFLICT, or None if unsupported"""
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            return sqlite.insert(table)
+        if dialect == "postgresql":
+            return postgresql.insert(table)
+        return None
+    
+    def _save_dimension(self, model, column: str, keys):
+        """Insert only keys not yet present in a dimension table, set-based and batched"""
+        table = model.__table__
+        stmt = self._dialect_insert(table)
+        
+        if stmt is not None:
+            # Let the database skip existing keys: INSERT ... ON CONFLICT DO NOTHING
+            stmt = stmt.on_conflict_do_nothing(index_elements=[column])
+            new_keys = list(keys)
+        else:
+            # Fall back to one query for the existing keys and insert the difference
+            existing = set(self.session.scalars(select(table.c[column])))
+            stmt = insert(table)
+            new_keys = [key for key in keys if key not in existing]
+        
+        for start in range(0, len(new_keys), self.batch_size):
+            batch = [{column: key} for key in new_keys[start:start + self.batch_size]]
+            self.session.execute(stmt, batch)
+        self._commit()
+    
+    @instrument("database.save_agents")
     def save_agents(self, df: pd.DataFrame):
         """Save unique agents to database"""
-        for agent_id in df["agent_id"].unique():
-            existing = self.session.query(Agent).filter_by(agent_id=agent_id).first()
-            if not existing:
-                agent = Agent(agent_id=agent_id)
-                self.session.add(agent)
-        self.session.commit()
-        self.logger.debug(f"Saved {df['agent_id'].nunique()} agents")
+        agent_ids = df["agent_id"].unique()
+        self._save_dimension(Agent, "agent_id", agent_ids)
+        self.logger.debug(f"Saved {len(agent_ids)} agents")
     
+    @instrument("database.save_retailers")
     def save_retailers(self, df: pd.DataFrame):
         """Save unique retailers to database"""
-        for retailer_id in df["retailer_id"].unique():
-            existing = self.session.query(Retailer).filter_by(retailer_id=retailer_id).first()
-            if not existing:
-                retailer = Retailer(retailer_id=retailer_id)
-                self.session.add(retailer)
-        self.session.commit()
-        self.logger.debug(f"Saved {df['retailer_id'].nunique()} retailers")
-    
-    def save_transactions(self, df: pd.DataFrame):
-        """Save transactions to database"""
-        for _, row in df.iterrows():
+        retailer_ids = df["retailer_id"].unique()
+        self._save_dimension(Retailer, "retailer_id", retailer_ids)
+        self.logger.debug(f"Saved {len(retailer_ids)} retailers")
+    
+    @instrument("database.save_transactions")
+    def save_transactions(self, df: pd.DataFrame, source_id: int = None):
+        """Save transactions to database, tagged with the ledger id of the file they came from"""
+        amounts = transaction_amounts(df)
+        for index, row in df.iterrows():
             transaction = Transaction(
                 agent_id=row["agent_id"],
                 retailer_id=row["retailer_id"],
-                transaction_amount=row["transaction_amount"],
-                date=pd.to_datetime(row["date"]).date()
+                transaction_amount=amounts[index],
+                date=pd.to_datetime(row["date"]).date(),
+                source_id=source_id,
             )
             self.session.add(transaction)
-        self.session.commit()
+        self._commit()
         self.logger.debug(f"Saved {len(df)} transactions")
     
-    def save_commissions(self, df: pd.DataFrame):
-        """Save commission data to database"""
-        # Clear existing commissions (recalculated each run)
-        self.session.query(Commission).delete()
+    @instrument("database.save_transactions_bulk")
+    def save_transactions_bulk(self, df: pd.DataFrame, batch_size: int = None, source_id: int = None):
+        """Save transactions with batched Core inserts, committing once per batch unless inside transaction()"""
+        batch_size = batch_size or self.batch_size
         
-        for _, row in df.iterrows():
-            commission = Commission(
-                agent_id=row["agent_id"],
-                total_sales=row["total_sales"],
-                commission_rate=row["commission_rate"],
-                commission_amount=row["commission_amount"]
-            )
-            self.session.add(commission)
-        self.session.commit()
+        # Convert dates once for the whole frame instead of per row
+        records = pd.DataFrame({
+            "agent_id": df["agent_id"],
+            "retailer_id": df["retailer_id"],
+            "transaction_amount": transaction_amounts(df),
+            "date": pd.to_datetime(df["date"]).dt.date,
+            "source_id": source_id,
+        })
+        
+        table = Transaction.__table__
+        for start in range(0, len(records), batch_size):
+            batch = records.iloc[start:start + batch_size].to_dict("records")
+            self.session.execute(insert(table), batch)
+            self._commit()
+        self.logger.debug(f"Bulk saved {len(df)} transactions (batch_size={batch_size})")
+    
+    @instrument("database.save_commissions")
+    def save_commissions(self, df: pd.DataFrame, replace: bool = True):
+        """Save commission data; replace=False only overwrites the agents present in df"""
+        if replace:
+            # Clear existing commissions (recalculated each run)
+            self.session.query(Commission).delete()
+        else:
+            agent_ids = list(df["agent_id"])
+            for start in range(0, len(agent_ids), 500):
+                chunk = agent_ids[start:start + 500]
+                self.session.execute(delete(Commission).where(Commission.agent_id.in_(chunk)))
+        
+        records = df[["agent_id", "total_sales", "commission_rate", "commission_amount"]].to_dict("records")
+        for start in range(0, len(records), self.batch_size):
+            self.session.execute(insert(Commission.__table__), records[start:start + self.batch_size])
+        self._commit()
         self.logger.debug(f"Saved {len(df)} commission records")
     
-    def save_all(self, transactions_df: pd.DataFrame, commissions_df: pd.DataFrame):
-        """Save all data to database"""
-        self.logger.info("Starting database save...")
-        try:
+    @instrument("database.refresh_commissions")
+    def refresh_commissions(self, rules: CommissionRules = None, as_of=None) -> int:
+        """Recompute every agent's commission in the database and replace the table
+        
+        Totals come from the agent x month rollup with INSERT ... SELECT ... GROUP BY agent_id and the tiers
+        become CASE expressions, so no rows travel through pandas. Uses the plan without a region, since
+        stored sales carry none, active on as_of (default: the last day of the latest stored month).
+        Readers keep seeing the previous commissions until the commit, which an enclosing transaction() defers.
+        """
+        if as_of is None:
+            latest_month = self.session.scalar(select(func.max(AgentMonthlySales.month)))
+            as_of = pd.Period(latest_month, freq="M").end_time.date() if latest_month else None
+        plan = (rules or CommissionRules.load()).plan_for(None, as_of)
+        totals = (
+            select(AgentMonthlySales.agent_id, func.sum(AgentMonthlySales.total_sales).label("total_sales"))
+            .group_by(AgentMonthlySales.agent_id)
+            .subquery()
+        )
+        rate, amount = commission_exprs(plan, totals.c.total_sales)
+        columns = ["agent_id", "total_sales", "commission_rate", "commission_amount"]
+        
+        # Do the aggregation into staging first; the commissions table is only touched by the short swap
+        connection = self.session.connection()
+        commissions_staging.create(connection, checkfirst=True)
+        self.session.execute(delete(commissions_staging))
+        self.session.execute(
+            insert(commissions_staging).from_select(columns, select(totals.c.agent_id, totals.c.total_sales, rate, amount))
+        )
+        self.session.execute(delete(Commission))
+        result = self.session.execute(
+            insert(Commission).from_select(columns, select(*[commissions_staging.c[c] for c in columns]))
+        )
+        commissions_staging.drop(connection)
+        self._commit()
+        self.logger.info(f"Refreshed {result.rowcount} commissions in the database with plan {plan.name}")
+        return result.rowcount
+    
+    def get_agent_totals(self, agent_ids) -> pd.DataFrame:
+        """Return stored (agent_id, total_sales) for the given agents, looked up 500 IDs per query"""
+        agent_ids = list(dict.fromkeys(agent_ids))
+        rows = []
+        for start in range(0, len(agent_ids), 500):
+            chunk = agent_ids[start:start + 500]
+            query = select(Commission.agent_id, Commission.total_sales).where(Commission.agent_id.in_(chunk))
+            rows.extend(self.session.execute(query).all())
+        return pd.DataFrame(rows, columns=["agent_id", "total_sales"])
+    
+    def get_watermark(self, file_path: str) -> tuple[int, str]:
+        """Return (byte_offset, content_hash) already ingested for a file, or (0, None)"""
+        entry = self.session.query(IngestionLedger).filter_by(file_path=os.path.abspath(file_path)).first()
+        if not entry:
+            return 0, None
+        return entry.byte_offset, entry.content_hash
+    
+    def first_row(self, file_path: str) -> int:
+        """Data rows before the stored watermark of a file, or None if its entry was recorded without that count"""
+        entry = self.session.query(IngestionLedger).filter_by(file_path=os.path.abspath(file_path)).first()
+        if not entry or not entry.byte_offset:
+            return 0
+        return entry.rows_read
+    
+    def record_watermark(self, file_path: str, byte_offset: int, content_hash: str, rows_loaded: int,
+                         rows_read: int = None):
+        """Record that a file has been ingested up to byte_offset, with rows_read data rows before it"""
+        file_path = os.path.abspath(file_path)
+        entry = self.session.query(IngestionLedger).filter_by(file_path=file_path).first()
+        if not entry:
+            entry = IngestionLedger(file_path=file_path, rows_loaded=0)
+            self.session.add(entry)
+        entry.byte_offset = byte_offset
+        entry.content_hash = content_hash
+        entry.rows_loaded += rows_loaded
+        entry.rows_read = rows_read
+        entry.updated_at = datetime.now()
+        self._commit()
+        self.logger.info(f"Ingestion watermark for {file_path}: {byte_offset} bytes")
+    
+    def source_id(self, file_path: str) -> int:
+        """Ledger id that rows loaded from file_path are tagged with, creating its entry on the first load"""
+        file_path = os.path.abspath(file_path)
+        entry = self.session.query(IngestionLedger).filter_by(file_path=file_path).first()
+        if not entry:
+            entry = IngestionLedger(file_path=file_path, byte_offset=0, content_hash="", rows_loaded=0,
+                                    rows_read=0, updated_at=datetime.now())
+            self.session.add(entry)
+            self.session.flush()
+        return entry.id
+    
+    def remove_sources(self, file_paths: list[str]) -> int:
+        """Delete the rows earlier loads took from these files and reset their watermarks; return rows deleted
+        
+        Rollups and commissions are then rebuilt from the remaining transactions, so the files can be
+        loaded again from the start without counting anything twice.
+        """
+        deleted = 0
+        for file_path in map(os.path.abspath, file_paths):
+            entry = self.session.query(IngestionLedger).filter_by(file_path=file_path).first()
+            if not entry or not entry.rows_loaded:
+                continue
+            rows = self.session.execute(delete(Transaction).where(Transaction.source_id == entry.id)).rowcount
+            if rows != entry.rows_loaded:
+                raise RuntimeError(f"Only {rows} of the {entry.rows_loaded} rows loaded from {file_path} are tagged "
+                                   f"with their source, so they cannot be replaced; it was loaded before init-db "
+                                   f"added transactions.source_id")
+            entry.byte_offset, entry.content_hash, entry.rows_loaded, entry.rows_read = 0, "", 0, 0
+            deleted += rows
+            self.logger.info(f"Removed {rows} rows previously loaded from {file_path}")
+        
+        if deleted:
+            self.rebuild_rollups()
+            self.refresh_commissions()
+        self._commit()
+        return deleted
+    
+    def _increment_rollup(self, model, totals: pd.DataFrame, keys: list[str]):
+        """Add total_sales deltas to a rollup table, inserting keys seen for the first time"""
+        table = model.__table__
+        records = totals.to_dict("records")
+        stmt = self._dialect_insert(table)
+        
+        if stmt is not None:
+            # INSERT ... ON CONFLICT DO UPDATE SET total_sales = total_sales + excluded.total_sales
+            stmt = stmt.on_conflict_do_update(
+                index_elements=keys,
+                set_={"total_sales": table.c.total_sales + stmt.excluded.total_sales},
+            )
+            for start in range(0, len(records), self.batch_size):
+                self.session.execute(stmt, records[start:start + self.batch_size])
+        else:
+            existing = set(self.session.execute(select(*[table.c[k] for k in keys])).all())
+            new_records = [r for r in records if tuple(r[k] for k in keys) not in existing]
+            updates = [{**{f"key_{k}": r[k] for k in keys}, "delta": r["total_sales"]}
+                       for r in records if tuple(r[k] for k in keys) in existing]
+            if new_records:
+                self.session.execute(insert(table), new_records)
+            if updates:
+                self.session.execute(
+                    update(table)
+                    .where(and_(*[table.c[k] == bindparam(f"key_{k}") for k in keys]))
+                    .values(total_sales=table.c.total_sales + bindparam("delta")),
+                    updates,
+                )
+        self._commit()
+    
+    @instrument("database.save_rollups")
+    def save_rollups(self, df: pd.DataFrame):
+        """Add a batch of transactions to the monthly, per-retailer and agent x month rollups"""
+        frame = pd.DataFrame({
+            "agent_id": df["agent_id"],
+            "retailer_id": df["retailer_id"],
+            "month": pd.to_datetime(df["date"]).dt.strftime("%Y-%m"),
+            "total_sales": transaction_amounts(df),
+        })
+        
+        monthly = frame.groupby("month", observed=True)["total_sales"].sum().reset_index()
+        by_retailer = frame.groupby("retailer_id", observed=True)["total_sales"].sum().reset_index()
+        by_agent_month = frame.groupby(["agent_id", "month"], observed=True)["total_sales"].sum().reset_index()
+        
+        self._increment_rollup(MonthlySales, monthly, ["month"])
+        self._increment_rollup(RetailerSales, by_retailer, ["retailer_id"])
+        self._increment_rollup(AgentMonthlySales, by_agent_month, ["agent_id", "month"])
+        self.logger.debug(f"Updated rollups for {len(df)} transactions")
+    
+    @instrument("database.rebuild_rollups")
+    def rebuild_rollups(self):
+        """Recompute all rollup tables from the transactions table with INSERT ... SELECT"""
+        month = month_expr(Transaction.date, self.engine.dialect.name)
+        amount = func.sum(Transaction.transaction_amount)
+        
+        for model in (MonthlySales, RetailerSales, AgentMonthlySales):
+            self.session.execute(delete(model))
+        self.session.execute(
+            insert(MonthlySales).from_select(["month", "total_sales"], select(month, amount).group_by(month))
+        )
+        self.session.execute(
+            insert(RetailerSales).from_select(
+                ["retailer_id", "total_sales"],
+                select(Transaction.retailer_id, amount).group_by(Transaction.retailer_id),
+            )
+        )
+        self.session.execute(
+            insert(AgentMonthlySales).from_select(
+                ["agent_id", "month", "total_sales"],
+                select(Transaction.agent_id, month, amount).group_by(Transaction.agent_id, month),
+            )
+        )
+        self._commit()
+        self.logger.info("Rebuilt rollup tables from transactions")
+    
+    def _bootstrap_rollups(self):
+        """Populate rollups for databases that have transactions loaded before rollups existed"""
+        has_rollups = self.session.execute(select(MonthlySales.month).limit(1)).first()
+        has_transactions = self.session.execute(select(Transaction.id).limit(1)).first()
+        if has_transactions and not has_rollups:
+            self.rebuild_rollups()
+    
+    def mark_loaded(self):
+        """Bump the data generation so API caches drop responses computed before this load"""
+        version = self.session.get(DataVersion, 1)
+        if not version:
+            version = DataVersion(id=1, generation=0)
+            self.session.add(version)
+        version.generation += 1
+        version.loaded_at = datetime.now()
+        self._commit()
+        self.logger.debug(f"Data generation is now {version.generation}")
+    
+    @instrument("database.save_batch")
+    def save_batch(self, transactions_df: pd.DataFrame, bulk: bool = True, source_id: int = None):
+        """Save agents, retailers, transactions and rollups for one batch of valid rows in one transaction"""
+        with self.transaction():
             self.save_agents(transactions_df)
             self.save_retailers(transactions_df)
-            self.save_transactions(transactions_df)
-            self.save_commissions(commissions_df)
+            if bulk:
+                self.save_transactions_bulk(transactions_df, source_id=source_id)
+            else:
+                self.save_transactions(transactions_df, source_id=source_id)
+            self.save_rollups(transactions_df)
+    
+    @instrument("database.save_all")
+    def save_all(self, transactions_df: pd.DataFrame, commissions_df: pd.DataFrame = None, bulk: bool = True,
+                 replace_commissions: bool = True, source_id: int = None):
+        """Save all data to database; bulk=False uses the per-row ORM path for small loads
+        
+        Without commissions_df the commissions are recomputed in the database with refresh_commissions.
+        Everything is one transaction, so a failed load leaves no partial rows behind.
+        """
+        self.logger.info("Starting database save...")
+        try:
+            with self.transaction():
+                self.save_batch(transactions_df, bulk=bulk, source_id=source_id)
+                if commissions_df is None:
+                    self.refresh_commissions()
+                else:
+                    self.save_commissions(commissions_df, replace=replace_commissions)
+                self.mark_loaded()
             self.logger.info("All data saved successfully")
         except Exception as e:
             self.logger.error(f"Database save failed: {e}")
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, create_engine
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Index, create_engine, func
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
+def month_expr(column, dialect: str):
+    """SQL expression formatting a date column as YYYY-MM for the given dialect"""
+    if dialect == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
 class Agent(Base):
     __tablename__ = "agents"
     
@@ -20,14 +26,35 @@ class Retailer(Base):
     
     transactions = relationship("Transaction", back_populates="retailer")
 
+# Index names an earlier schema created that a wider index now covers; init_schema drops them
+SUPERSEDED_INDEXES = {
+    "transactions": ["ix_transactions_agent_amount", "ix_transactions_retailer_amount"],
+}
+
+# Nullable columns added to tables that may predate them; init_schema adds them with ALTER TABLE
+ADDED_COLUMNS = {
+    "transactions": ["source_id"],
+    "ingestion_ledger": ["rows_read"],
+}
+
 class Transaction(Base):
     __tablename__ = "transactions"
+    # Composite indexes lead with the filter column and include the amount, so per-agent,
+    # per-retailer and date-range sums are answered from the index alone; the agent and
+    # retailer indexes also carry the date for time-bucketed reports over those dimensions
+    __table_args__ = (
+        Index("ix_transactions_agent_date_amount", "agent_id", "date", "transaction_amount"),
+        Index("ix_transactions_retailer_date_amount", "retailer_id", "date", "transaction_amount"),
+        Index("ix_transactions_date_amount", "date", "transaction_amount"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     agent_id = Column(String, ForeignKey("agents.agent_id"), nullable=False)
     retailer_id = Column(String, ForeignKey("retailers.retailer_id"), nullable=False)
     transaction_amount = Column(Float, nullable=False)
     date = Column(Date, nullable=False)
+    # Ledger entry of the file the row was loaded from, so reloading that file can replace its rows
+    source_id = Column(Integer, ForeignKey("ingestion_ledger.id"), index=True)
     
     agent = relationship("Agent", back_populates="transactions")
     retailer = relationship("Retailer", back_populates="transactions")
@@ -36,9 +63,47 @@ class Commission(Base):
     __tablename__ = "commissions"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    agent_id = Column(String, ForeignKey("agents.agent_id"), nullable=False)
+    agent_id = Column(String, ForeignKey("agents.agent_id"), nullable=False, index=True)
     total_sales = Column(Float, nullable=False)
     commission_rate = Column(Float, nullable=False)
     commission_amount = Column(Float, nullable=False)
     
-    agent = relationship("Agent", back_populates="commissions")
\ No newline at end of file
+    agent = relationship("Agent", back_populates="commissions")
+
+class MonthlySales(Base):
+    __tablename__ = "monthly_sales"
+    
+    month = Column(String, primary_key=True)  # YYYY-MM
+    total_sales = Column(Float, nullable=False)
+
+class RetailerSales(Base):
+    __tablename__ = "retailer_sales"
+    
+    retailer_id = Column(String, ForeignKey("retailers.retailer_id"), primary_key=True)
+    total_sales = Column(Float, nullable=False)
+
+class AgentMonthlySales(Base):
+    __tablename__ = "agent_monthly_sales"
+    
+    agent_id = Column(String, ForeignKey("agents.agent_id"), primary_key=True)
+    month = Column(String, primary_key=True)  # YYYY-MM
+    total_sales = Column(Float, nullable=False)
+
+class IngestionLedger(Base):
+    __tablename__ = "ingestion_ledger"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_path = Column(String, unique=True, nullable=False)
+    byte_offset = Column(Integer, nullable=False)
+    content_hash = Column(String, nullable=False)
+    rows_loaded = Column(Integer, nullable=False)
+    # Data rows, valid or rejected, before byte_offset; numbers the rows of the next appended range
+    rows_read = Column(Integer)
+    updated_at = Column(DateTime, nullable=False)
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+    
+    id = Column(Integer, primary_key=True)  # single row, id = 1
+    generation = Column(Integer, nullable=False)
+    loaded_at = Column(DateTime, nullable=False)
\ No newline at end of file
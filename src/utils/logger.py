@@ -1,25 +1,70 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 
-def setup_logger(name: str, log_file: str = "logs/pipeline.log", level=logging.INFO):
-    """Create logs directory if not exists, configure formatter with timestamp, return configured logger"""
-    
-    # Create logs directory if it doesn't exist
-    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+# Opt-in logging options, set with configure_logging() or the environment before loggers are created
+_options = {
+    "async": os.getenv("PIPELINE_LOG_ASYNC", "0") == "1",
+    "json": os.getenv("PIPELINE_LOG_JSON", "0") == "1",
+    "sample_every": {},
+}
+
+# One queue and background writer per log file in async mode
+_listeners = {}
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
     
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class SamplingFilter(logging.Filter):
+    """Keep only one of every N records per level, e.g. {logging.WARNING: 100}"""
     
-    # Prevent duplicate handlers
-    if logger.handlers:
-        return logger
+    def __init__(self, sample_every: dict):
+        super().__init__()
+        self.sample_every = sample_every
+        self.seen = {}
     
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = self.sample_every.get(record.levelno)
+        if not every or every <= 1:
+            return True
+        count = self.seen.get(record.levelno, 0)
+        self.seen[record.levelno] = count + 1
+        return count % every == 0
+
+def configure_logging(async_mode: bool = None, json_format: bool = None, sample_every: dict = None):
+    """Set logging options for loggers created afterwards by setup_logger"""
+    if async_mode is not None:
+        _options["async"] = async_mode
+    if json_format is not None:
+        _options["json"] = json_format
+    if sample_every is not None:
+        _options["sample_every"] = {logging.getLevelName(k) if isinstance(k, str) else k: v
+                                    for k, v in sample_every.items()}
+
+def _create_handlers(log_file: str) -> list[logging.Handler]:
+    """File handler (DEBUG and up) and stdout handler (INFO and up) sharing one formatter"""
     # Format for logs
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
+    if _options["json"]:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        )
     
     # File handler
     file_handler = logging.FileHandler(log_file)
@@ -31,8 +76,68 @@ def setup_logger(name: str, log_file: str = "logs/pipeline.log", level=logging.I
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
     
-    # Add handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    return [file_handler, console_handler]
+
+def _queue_handler(log_file: str) -> logging.Handler:
+    """Return the QueueHandler for log_file, starting its background writer on first use"""
+    if log_file not in _listeners:
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, *_create_handlers(log_file), respect_handler_level=True)
+        listener.start()
+        _listeners[log_file] = (logging.handlers.QueueHandler(log_queue), listener)
+    return _listeners[log_file][0]
+
+def _write_directly(queue_handler: logging.Handler, handlers: list[logging.Handler]):
+    """Swap queue_handler for the handlers it fed on every logger using it"""
+    for logger in list(logging.Logger.manager.loggerDict.values()):
+        if isinstance(logger, logging.Logger) and queue_handler in logger.handlers:
+            logger.removeHandler(queue_handler)
+            for handler in handlers:
+                logger.addHandler(handler)
+
+def shutdown_logging():
+    """Drain and stop the background writers; loggers fall back to writing synchronously. Safe to call repeatedly"""
+    while _listeners:
+        _, (queue_handler, listener) = _listeners.popitem()
+        listener.stop()
+        _write_directly(queue_handler, listener.handlers)
+        for handler in listener.handlers:
+            handler.flush()
+
+def init_worker_logging():
+    """Process pool initializer: log synchronously in the worker
+    
+    A forked worker inherits the parent's QueueHandlers but not the listener threads that drain
+    them, so in async mode every record it logs would be lost.
+    """
+    _options["async"] = False
+    while _listeners:
+        _, (queue_handler, listener) = _listeners.popitem()
+        _write_directly(queue_handler, listener.handlers)
+
+atexit.register(shutdown_logging)
+
+def setup_logger(name: str, log_file: str = "logs/pipeline.log", level=logging.INFO):
+    """Create logs directory if not exists, configure formatter with timestamp, return configured logger"""
+    
+    # Create logs directory if it doesn't exist
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    
+    # Create logger
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    
+    # Prevent duplicate handlers
+    if logger.handlers:
+        return logger
+    
+    # Async mode hands records to a queue; a single listener thread does the I/O
+    handlers = [_queue_handler(log_file)] if _options["async"] else _create_handlers(log_file)
+    
+    # Add handlers; sampling drops high-volume records before they are formatted or queued
+    if _options["sample_every"]:
+        logger.addFilter(SamplingFilter(_options["sample_every"]))
+    for handler in handlers:
+        logger.addHandler(handler)
     
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,140 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows has no resource module; peak RSS is reported as None
+    resource = None
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far, or None if the platform cannot report it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+class MetricsRegistry:
+    """Per-stage call counts, wall time, rows processed and peak RSS for the current process"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Forget all stages and start a new run"""
+        with self._lock:
+            self.stages = {}
+            self.started_at = datetime.now()
+            self._start = time.perf_counter()
+    
+    def record(self, stage: str, seconds: float, rows: int = None):
+        """Add one timed call of a stage"""
+        rss = peak_rss_bytes()
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "seconds": 0.0, "rows": 0, "peak_rss_bytes": None})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["rows"] += rows or 0
+            entry["peak_rss_bytes"] = rss
+    
+    def report(self) -> dict:
+        """Snapshot of all stages with derived rows/sec"""
+        with self._lock:
+            stages = {
+                name: {**entry, "rows_per_sec": entry["rows"] / entry["seconds"] if entry["seconds"] else None}
+                for name, entry in self.stages.items()
+            }
+            return {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "wall_seconds": time.perf_counter() - self._start,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "stages": stages,
+            }
+    
+    def write_report(self, path: str, **extra) -> dict:
+        """Write the run report as JSON, with extra top-level fields such as the run status"""
+        report = {**self.report(), **extra}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+    
+    def to_prometheus(self) -> str:
+        """Render the stages in the Prometheus text exposition format"""
+        report = self.report()
+        lines = [
+            "# HELP pipeline_stage_calls_total Timed calls per stage",
+            "# TYPE pipeline_stage_calls_total counter",
+        ]
+        lines += [f'pipeline_stage_calls_total{{stage="{name}"}} {s["calls"]}' for name, s in report["stages"].items()]
+        lines += [
+            "# HELP pipeline_stage_seconds_total Wall time spent per stage",
+            "# TYPE pipeline_stage_seconds_total counter",
+        ]
+        lines += [f'pipeline_stage_seconds_total{{stage="{name}"}} {s["seconds"]:.6f}' for name, s in report["stages"].items()]
+        lines += [
+            "# HELP pipeline_stage_rows_total Rows processed per stage",
+            "# TYPE pipeline_stage_rows_total counter",
+        ]
+        lines += [f'pipeline_stage_rows_total{{stage="{name}"}} {s["rows"]}' for name, s in report["stages"].items()]
+        if report["peak_rss_bytes"] is not None:
+            lines += [
+                "# HELP process_peak_rss_bytes Peak resident set size of the process",
+                "# TYPE process_peak_rss_bytes gauge",
+                f"process_peak_rss_bytes {report['peak_rss_bytes']}",
+            ]
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry used by timed() and instrument()
+metrics = MetricsRegistry()
+
+class _Timer:
+    """Handle yielded by timed(); set .rows inside the block if it was not known up front"""
+    
+    def __init__(self, rows: int = None):
+        self.rows = rows
+        self.seconds = None
+
+@contextmanager
+def timed(stage: str, rows: int = None):
+    """Time a block as one call of stage, also when it raises"""
+    timer = _Timer(rows)
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.seconds = time.perf_counter() - start
+        metrics.record(stage, timer.seconds, timer.rows)
+
+def _row_count(args, result=None) -> int:
+    """Rows a call handled: the first DataFrame argument, else a DataFrame result"""
+    # pandas is only imported by the stages that use it; keep this module cheap to import
+    pd = sys.modules.get("pandas")
+    if pd is None:
+        return None
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            return len(arg)
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    return None
+
+def instrument(stage: str):
+    """Decorator timing each call as stage; rows come from the DataFrame passed in or returned"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage, rows=_row_count(args + tuple(kwargs.values()))) as timer:
+                result = func(*args, **kwargs)
+                if timer.rows is None:
+                    timer.rows = _row_count((), result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,8 @@
+import pytest
+from src.ingestion import reader
+
+
+@pytest.fixture(autouse=True)
+def isolated_rejects_sink(tmp_path, monkeypatch):
+    """Send rows rejected during tests to a temporary sink instead of logs/rejected_rows.log"""
+    monkeypatch.setattr(reader, "REJECTS_PATH", str(tmp_path / "rejected_rows.log"))
@@ -1,6 +1,13 @@
+import json
 import pytest
 import pandas as pd
+from datetime import date
+from src.ingestion.reader import DataReader, compact
 from src.processing.aggregator import DataAggregator
+from src.processing.commission import CommissionRules
+from src.processing.parallel import ingest_files, resolve_inputs
+from src.processing.sql_aggregator import SqlAggregator
+from src.storage.database import Database
 
 
 class TestDataAggregator:
@@ -80,3 +87,123 @@ class TestDataAggregator:
         # A001 has 6000 in sales (>= 5000), should get 8%
         assert result["commission_rate"].values[0] == 0.08
         assert result["commission_amount"].values[0] == 480.0  # 6000 * 0.08
+
+    def test_merge_totals_matches_single_pass(self, sample_data):
+        """Test merging per-batch partials equals aggregating the full frame"""
+        partials = [
+            DataAggregator(sample_data.iloc[:2]).sales_by_agent(),
+            DataAggregator(sample_data.iloc[2:]).sales_by_agent(),
+        ]
+        merged = DataAggregator.merge_totals(partials, "agent_id")
+
+        expected = DataAggregator(sample_data).sales_by_agent()
+        pd.testing.assert_frame_equal(merged, expected)
+
+    def test_parallel_ingest_matches_single_process(self, tmp_path):
+        """Test process-pool ingestion merges to the same totals as one process"""
+        for region, amount in [("east", "100.25"), ("west", "200.50"), ("north", "300.75")]:
+            (tmp_path / f"{region}.csv").write_text(
+                "agent_id,retailer_id,transaction_amount,date\n"
+                f"A001,R001,{amount},2024-01-15\nA002,R002,{amount},2024-02-10\n"
+            )
+        readers = [DataReader(path) for path in resolve_inputs(str(tmp_path))]
+
+        def merged(workers):
+            partials = [r["sales_by_agent"] for r in ingest_files(readers, workers)]
+            return DataAggregator.merge_totals(partials, "agent_id")
+
+        pd.testing.assert_frame_equal(merged(2), merged(1))
+        assert merged(1)["total_sales"].tolist() == [601.5, 601.5]
+
+    def test_totals_are_computed_once(self, sample_data, monkeypatch):
+        """Test all reports and commissions come from one cached aggregation pass"""
+        aggregator = DataAggregator(sample_data)
+        aggregator.sales_by_agent()
+
+        monkeypatch.setattr(pd, "factorize", lambda *args, **kwargs: pytest.fail("re-aggregated"))
+        aggregator.sales_by_retailer()
+        aggregator.monthly_totals()
+        result = aggregator.calculate_commission()
+
+        # Callers get copies, so mutating a result does not corrupt the cache
+        result["total_sales"] = 0.0
+        assert aggregator.sales_by_agent()["total_sales"].tolist() == [4000.0, 3000.0]
+
+    def test_commission_plan_follows_sales_period(self, sample_data, tmp_path):
+        """Test plans are chosen by the latest month in the data rather than today's date"""
+        config = {"plans": [
+            {"name": "promo-feb-2024", "valid_from": "2024-02-01", "valid_to": "2024-02-29",
+             "tiers": [{"min_sales": 0, "rate": 0.10}]},
+            {"name": "standard", "tiers": [{"min_sales": 0, "rate": 0.05}]}
+        ]}
+        path = tmp_path / "plans.json"
+        path.write_text(json.dumps(config))
+        rules = CommissionRules.load(str(path))
+
+        assert DataAggregator(sample_data).calculate_commission(rules)["commission_rate"].tolist() == [0.10, 0.10]
+        january = DataAggregator(sample_data.iloc[:2]).calculate_commission(rules)
+        assert january["commission_rate"].tolist() == [0.05]
+
+    def test_compact_schema_gives_same_totals(self, sample_data):
+        """Test categorical IDs and integer cents aggregate to the same totals"""
+        sample_data["date"] = pd.to_datetime(sample_data["date"])
+        expected = DataAggregator(sample_data)
+        compacted = DataAggregator(compact(sample_data, amounts_in_cents=True))
+
+        pd.testing.assert_frame_equal(compacted.sales_by_agent(), expected.sales_by_agent(), check_dtype=False)
+        pd.testing.assert_frame_equal(compacted.monthly_totals(), expected.monthly_totals())
+
+    def test_cents_sum_without_float_drift(self):
+        """Test summing integer cents avoids float accumulation error"""
+        data = pd.DataFrame({
+            "agent_id": ["A001"] * 10,
+            "retailer_id": ["R001"] * 10,
+            "transaction_amount": [0.1] * 10,
+            "date": pd.to_datetime(["2024-01-15"] * 10)
+        })
+
+        assert DataAggregator(data).sales_by_agent()["total_sales"].values[0] != 1.0
+        assert DataAggregator(compact(data, amounts_in_cents=True)).sales_by_agent()["total_sales"].values[0] == 1.0
+
+
+class TestSqlAggregator:
+    """Tests for the database-backed aggregator"""
+
+    @pytest.fixture
+    def sample_data(self):
+        """Transactions spread over three months"""
+        return pd.DataFrame({
+            "agent_id": ["A001", "A001", "A002", "A003"],
+            "retailer_id": ["R001", "R002", "R001", "R003"],
+            "transaction_amount": [1500.0, 2500.0, 3000.0, 6000.0],
+            "date": ["2024-01-15", "2024-01-20", "2024-02-10", "2024-03-05"]
+        })
+
+    @pytest.fixture
+    def db(self, tmp_path, sample_data):
+        """A database holding the sample transactions"""
+        db = Database(f"sqlite:///{tmp_path / 'test.db'}", init_schema=True)
+        db.save_all(sample_data)
+        yield db
+        db.close()
+
+    def test_matches_in_memory_aggregator(self, db, sample_data):
+        """Test every total and the commissions match DataAggregator over the same rows"""
+        expected = DataAggregator(sample_data)
+        aggregator = SqlAggregator(db.engine, chunksize=1)
+
+        pd.testing.assert_frame_equal(aggregator.sales_by_agent(), expected.sales_by_agent())
+        pd.testing.assert_frame_equal(aggregator.sales_by_retailer(), expected.sales_by_retailer())
+        pd.testing.assert_frame_equal(aggregator.monthly_totals(), expected.monthly_totals())
+        pd.testing.assert_frame_equal(aggregator.calculate_commission(), expected.calculate_commission())
+
+    def test_date_range_limits_rows(self, db):
+        """Test only transactions within the inclusive date range are aggregated"""
+        aggregator = SqlAggregator(db.engine, date_from=date(2024, 1, 20), date_to=date(2024, 2, 10))
+
+        assert aggregator.sales_by_agent().to_dict("list") == {"agent_id": ["A001", "A002"],
+                                                               "total_sales": [2500.0, 3000.0]}
+        assert aggregator.monthly_totals()["month"].astype(str).tolist() == ["2024-01", "2024-02"]
+
+        empty = SqlAggregator(db.engine, date_from=date(2030, 1, 1))
+        assert empty.sales_by_retailer().empty
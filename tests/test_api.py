@@ -1,11 +1,54 @@
+import asyncio
+import json
+import types
 import pytest
+import pandas as pd
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from src.api import routes
 from src.api.routes import app
+from src.storage.database import Database
+from src.utils.metrics import metrics
 
 
 client = TestClient(app)
 
 
+@pytest.fixture(scope="module", autouse=True)
+def test_db(tmp_path_factory):
+    """Point the API at a temporary database loaded with sample data"""
+    db_path = tmp_path_factory.mktemp("api") / "test.db"
+    db = Database(f"sqlite:///{db_path}", init_schema=True)
+    transactions = pd.DataFrame({
+        "agent_id": ["A001", "A001", "A002"],
+        "retailer_id": ["R001", "R002", "R001"],
+        "transaction_amount": [1500.0, 2500.0, 3000.0],
+        "date": ["2024-01-15", "2024-01-20", "2024-02-10"]
+    })
+    commissions = pd.DataFrame({
+        "agent_id": ["A001", "A002"],
+        "total_sales": [4000.0, 3000.0],
+        "commission_rate": [0.05, 0.05],
+        "commission_amount": [200.0, 150.0]
+    })
+    db.save_all(transactions, commissions)
+    db.close()
+
+    engine = routes.create_api_engine(f"sqlite+aiosqlite:///{db_path}")
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def get_test_session():
+        async with Session() as session:
+            yield session
+
+    app.dependency_overrides[routes.get_session] = get_test_session
+    routes.cache.clear()
+    routes.cache.check_interval = 0
+    yield db
+    app.dependency_overrides.clear()
+    routes.cache.clear()
+
+
 class TestAPI:
     """Tests for FastAPI endpoints"""
 
@@ -42,3 +85,148 @@ class TestAPI:
         """Test 404 for non-existent retailer"""
         response = client.get("/retailers/NONEXISTENT/sales")
         assert response.status_code == 404
+
+    def test_get_monthly_report_reads_rollup(self):
+        """Test monthly report returns the totals maintained at load time"""
+        response = client.get("/reports/monthly")
+        assert response.json()["monthly_sales"] == [
+            {"month": "2024-01", "total_sales": 4000.0},
+            {"month": "2024-02", "total_sales": 3000.0},
+        ]
+
+    def test_get_retailer_sales(self):
+        """Test retailer sales lookup"""
+        response = client.get("/retailers/R001/sales")
+        assert response.status_code == 200
+        assert response.json() == {"retailer_id": "R001", "total_sales": 4500.0}
+
+    def test_get_all_retailers_paginates(self):
+        """Test keyset pagination over retailers"""
+        first = client.get("/retailers?limit=1").json()
+        assert first["retailers"] == [{"retailer_id": "R001", "total_sales": 4500.0}]
+        assert first["next_after"] == "R001"
+
+        second = client.get(f"/retailers?after={first['next_after']}&limit=1").json()
+        assert second["retailers"] == [{"retailer_id": "R002", "total_sales": 2500.0}]
+
+    def test_get_all_agents_paginates(self):
+        """Test keyset pagination over agents"""
+        page = client.get("/agents?after=A001&limit=10").json()
+        assert [a["agent_id"] for a in page["agents"]] == ["A002"]
+        assert page["next_after"] is None
+
+    def test_page_size_is_bounded(self):
+        """Test limit above the maximum page size is rejected"""
+        response = client.get("/agents?limit=100000")
+        assert response.status_code == 422
+
+    def test_etag_returns_not_modified(self):
+        """Test If-None-Match with the current ETag returns 304 without a body"""
+        first = client.get("/reports/monthly")
+        etag = first.headers["etag"]
+
+        second = client.get("/reports/monthly", headers={"If-None-Match": etag})
+        assert second.status_code == 304
+        assert second.content == b""
+
+    def test_etag_matching_is_exact(self):
+        """Test If-None-Match compares whole tags, accepts W/ and * and ignores tag fragments"""
+        etag = client.get("/reports/monthly").headers["etag"]
+
+        assert client.get("/reports/monthly", headers={"If-None-Match": f'"x", W/{etag}'}).status_code == 304
+        assert client.get("/reports/monthly", headers={"If-None-Match": "*"}).status_code == 304
+        assert client.get("/reports/monthly", headers={"If-None-Match": f'"x{etag}"'}).status_code == 200
+
+    def test_cache_hits_and_invalidation_on_load(self, test_db):
+        """Test repeated requests hit the cache until a pipeline load bumps the generation"""
+        client.get("/reports/monthly")
+        hits = client.get("/cache/stats").json()["hits"]
+        etag = client.get("/reports/monthly").headers["etag"]
+        assert client.get("/cache/stats").json()["hits"] == hits + 1
+
+        test_db.mark_loaded()
+        response = client.get("/reports/monthly", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    def test_metrics_endpoint(self):
+        """Test /metrics exposes per-route request timings in the Prometheus text format"""
+        client.get("/reports/monthly")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'pipeline_stage_calls_total{stage="api.GET /reports/monthly"}' in response.text
+
+    def test_request_timer_waits_for_the_last_body_message(self):
+        """Test a streamed response is timed until its final body chunk, not until its headers"""
+        async def slow_stream(scope, receive, send):
+            scope["route"] = types.SimpleNamespace(path="/slow")
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"first", "more_body": True})
+            await asyncio.sleep(0.05)
+            await send({"type": "http.response.body", "body": b"last", "more_body": False})
+
+        async def send(message):
+            pass
+
+        asyncio.run(routes.RequestTimer(slow_stream)({"type": "http", "method": "GET"}, None, send))
+        assert metrics.stages["api.GET /slow"]["seconds"] >= 0.05
+
+    def test_sales_report_groups_and_filters(self):
+        """Test /reports/sales aggregates by the requested dimensions within the date range and filters"""
+        response = client.get("/reports/sales?group_by=agent&group_by=month&from=2024-01-16&to=2024-12-31")
+        assert response.status_code == 200
+        assert response.json()["rows"] == [
+            {"agent_id": "A001", "month": "2024-01", "total_sales": 2500.0, "transactions": 1},
+            {"agent_id": "A002", "month": "2024-02", "total_sales": 3000.0, "transactions": 1},
+        ]
+
+        response = client.get("/reports/sales?group_by=retailer&agent_id=A001&agent_id=A002&retailer_id=R001")
+        assert response.json()["rows"] == [{"retailer_id": "R001", "total_sales": 4500.0, "transactions": 2}]
+
+    def test_sales_report_streams_csv(self):
+        """Test /reports/sales returns CSV by day when asked"""
+        response = client.get("/reports/sales?group_by=day&format=csv&agent_id=A001")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert response.text.splitlines() == [
+            "day,total_sales,transactions",
+            "2024-01-15,1500.0,1",
+            "2024-01-20,2500.0,1",
+        ]
+
+    def test_sales_report_rejects_bad_parameters(self):
+        """Test unknown dimensions and inverted date ranges are rejected"""
+        assert client.get("/reports/sales?group_by=week").status_code == 422
+        assert client.get("/reports/sales?from=2024-03-01&to=2024-01-01").status_code == 422
+
+    def test_export_transactions_ndjson_with_date_range(self):
+        """Test /export/transactions streams NDJSON rows in load order within the date range"""
+        response = client.get("/export/transactions?from=2024-01-16&to=2024-02-10")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert rows == [
+            {"agent_id": "A001", "retailer_id": "R002", "transaction_amount": 2500.0, "date": "2024-01-20"},
+            {"agent_id": "A002", "retailer_id": "R001", "transaction_amount": 3000.0, "date": "2024-02-10"},
+        ]
+
+    def test_export_commissions_csv_gzip(self):
+        """Test /export/commissions streams gzip-encoded CSV"""
+        response = client.get("/export/commissions?format=csv&gzip=true")
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text.splitlines() == [
+            "agent_id,total_sales,commission_rate,commission_amount",
+            "A001,4000.0,0.05,200.0",
+            "A002,3000.0,0.05,150.0",
+        ]
+
+    def test_export_transactions_arrow(self):
+        """Test /export/transactions streams an Arrow IPC stream with typed columns"""
+        pa = pytest.importorskip("pyarrow")
+        response = client.get("/export/transactions?format=arrow&agent_id=A001")
+        assert response.status_code == 200
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.schema.field("date").type == pa.date32()
+        assert table.column("transaction_amount").to_pylist() == [1500.0, 2500.0]
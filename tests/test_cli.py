@@ -0,0 +1,188 @@
+import os
+import subprocess
+import sys
+import pandas as pd
+import pytest
+import main
+
+
+class TestCLI:
+    """Tests for the main.py subcommands"""
+
+    def test_help_does_not_import_heavy_modules(self):
+        """Test the CLI dispatches without importing pandas, SQLAlchemy or FastAPI"""
+        proc = subprocess.run([sys.executable, "-X", "importtime", "main.py", "--help"],
+                              cwd=os.path.dirname(os.path.abspath(main.__file__)), capture_output=True, text=True, check=True)
+        imported = {line.split("|")[-1].strip() for line in proc.stderr.splitlines()}
+
+        assert "init-db" in proc.stdout
+        assert not imported & {"pandas", "sqlalchemy", "fastapi", "uvicorn"}
+
+    def test_aggregate_prints_reports_without_a_database(self, tmp_path, capsys):
+        """Test aggregate ingests and reports commissions without touching the database"""
+        csv_path = tmp_path / "transactions.csv"
+        pd.DataFrame({
+            "agent_id": ["A001", "A001", "A002"],
+            "retailer_id": ["R001", "R002", "R001"],
+            "transaction_amount": [3000.0, 2500.0, 100.0],
+            "date": ["2024-01-15", "2024-01-20", "2024-02-10"]
+        }).to_csv(csv_path, index=False)
+
+        main.main(["aggregate", "--file", str(csv_path)])
+        output = capsys.readouterr().out
+
+        assert "--- Commissions ---" in output
+        assert "440.0" in output
+
+    def test_streamed_totals_are_folded_per_batch(self, tmp_path, capsys):
+        """Test aggregate --chunksize keeps one running total per report and matches the unbatched totals"""
+        partials = []
+        for amounts in ([100.0, 200.0], [50.0]):
+            batch = pd.DataFrame({"agent_id": ["A001", "A002"][:len(amounts)], "total_sales": amounts})
+            partials = main.fold_partial(partials, batch, "agent_id")
+        assert len(partials) == 1
+        assert partials[0]["total_sales"].tolist() == [150.0, 200.0]
+
+        csv_path = tmp_path / "transactions.csv"
+        csv_path.write_text("agent_id,retailer_id,transaction_amount,date\n"
+                            "A001,R001,3000.0,2024-01-15\nA001,R002,2500.0,2024-01-20\nA002,R001,100.0,2024-02-10\n")
+        main.main(["aggregate", "--file", str(csv_path)])
+        unbatched = capsys.readouterr().out
+        main.main(["aggregate", "--file", str(csv_path), "--chunksize", "1"])
+        assert capsys.readouterr().out == unbatched
+
+    def test_aggregate_date_range_requires_from_db_and_iso_dates(self, capsys):
+        """Test --from/--to are rejected without --from-db and when they are not ISO dates"""
+        with pytest.raises(SystemExit):
+            main.main(["aggregate", "--from", "2024-01-01"])
+        assert "require --from-db" in capsys.readouterr().err
+
+        with pytest.raises(SystemExit):
+            main.main(["aggregate", "--from-db", "--to", "2024-13-01"])
+        assert "invalid fromisoformat value" in capsys.readouterr().err
+
+    def test_incremental_load_skips_unterminated_line_and_refuses_rewrites(self, tmp_path, monkeypatch):
+        """Test a rerun loads only complete appended lines once and a rewritten file is not reloaded"""
+        from sqlalchemy import func, select
+        from src.storage.database import Database
+        from src.storage.models import Commission, Transaction
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "data").mkdir()
+        main.init_db()
+        csv_path = tmp_path / "transactions.csv"
+        csv_path.write_text("agent_id,retailer_id,transaction_amount,date\n"
+                            "A001,R001,1000.0,2024-01-15\nA001,R002,2000.0,2024-01-20\n")
+
+        def stored():
+            db = Database()
+            count = db.session.scalar(select(func.count()).select_from(Transaction))
+            total = db.session.scalar(select(Commission.total_sales).where(Commission.agent_id == "A001"))
+            db.close()
+            return count, total
+
+        main.run_pipeline(str(csv_path), metrics_path=None)
+        with open(csv_path, "a") as f:
+            f.write("A001,R001,500.0,2024-02")
+        main.run_pipeline(str(csv_path), metrics_path=None)
+        assert stored() == (2, 3000.0)
+
+        with open(csv_path, "a") as f:
+            f.write("-10\n")
+        main.run_pipeline(str(csv_path), metrics_path=None)
+        assert stored() == (3, 3500.0)
+
+        csv_path.write_text("agent_id,retailer_id,transaction_amount,date\nA001,R001,1.0,2024-03-01\n")
+        with pytest.raises(SystemExit):
+            main.run_pipeline(str(csv_path), metrics_path=None)
+        assert stored() == (3, 3500.0)
+
+    def test_appended_rejects_are_numbered_by_their_row_in_the_file(self, tmp_path, monkeypatch):
+        """Test rows rejected from an appended byte range report their row in the whole file, not in the range"""
+        from sqlalchemy import update
+        from src.ingestion import reader
+        from src.storage.database import Database
+        from src.storage.models import IngestionLedger
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "data").mkdir()
+        main.init_db()
+        csv_path = tmp_path / "transactions.csv"
+        csv_path.write_text("agent_id,retailer_id,transaction_amount,date\n"
+                            "A001,R001,1000.0,2024-01-15\n,R002,2000.0,2024-01-20\n")
+        main.run_pipeline(str(csv_path), metrics_path=None)
+        with open(csv_path, "a") as f:
+            f.write("A001,R001,500.0,2024-02-10\nA002,R001,bad,2024-02-11\n")
+        main.run_pipeline(str(csv_path), chunksize=1, metrics_path=None)
+
+        # A ledger entry recorded before rows_read existed falls back to counting the prefix
+        db = Database()
+        db.session.execute(update(IngestionLedger).values(rows_read=None))
+        db.session.commit()
+        db.close()
+        with open(csv_path, "a") as f:
+            f.write(",R003,1.0,2024-03-01\n")
+        main.run_pipeline(str(csv_path), metrics_path=None)
+
+        rejects = pd.read_json(reader.REJECTS_PATH, lines=True)
+        assert rejects["source_row"].tolist() == [1, 3, 4]
+
+    def test_full_reload_replaces_the_files_earlier_rows(self, tmp_path, monkeypatch):
+        """Test load --full deletes what earlier loads took from the file, so nothing is counted twice"""
+        from sqlalchemy import func, select
+        from src.storage.database import Database
+        from src.storage.models import Commission, IngestionLedger, MonthlySales, Transaction
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "data").mkdir()
+        main.init_db()
+        other_path, csv_path = tmp_path / "other.csv", tmp_path / "transactions.csv"
+        other_path.write_text("agent_id,retailer_id,transaction_amount,date\nA001,R009,50.0,2024-01-05\n")
+        csv_path.write_text("agent_id,retailer_id,transaction_amount,date\n"
+                            "A001,R001,1000.0,2024-01-15\nA002,R002,2000.0,2024-01-20\n")
+
+        def stored():
+            db = Database()
+            state = (
+                db.session.scalar(select(func.count()).select_from(Transaction)),
+                db.session.scalar(select(MonthlySales.total_sales)),
+                dict(db.session.execute(select(Commission.agent_id, Commission.total_sales)).all()),
+                db.session.scalar(select(IngestionLedger.rows_loaded).where(IngestionLedger.file_path == str(csv_path))),
+            )
+            db.close()
+            return state
+
+        main.run_pipeline(str(other_path), metrics_path=None)
+        main.run_pipeline(str(csv_path), metrics_path=None)
+        loaded = stored()
+        assert loaded == (3, 3050.0, {"A001": 1050.0, "A002": 2000.0}, 2)
+
+        main.run_pipeline(str(csv_path), incremental=False, metrics_path=None)
+        assert stored() == loaded
+
+        csv_path.write_text("agent_id,retailer_id,transaction_amount,date\nA002,R001,10.0,2024-01-15\n")
+        main.run_pipeline(str(csv_path), incremental=False, metrics_path=None)
+        assert stored() == (2, 60.0, {"A001": 50.0, "A002": 10.0}, 1)
+
+    def test_chunksize_streams_every_file_and_rejects_workers(self, tmp_path, monkeypatch):
+        """Test --chunksize streams each input file of a directory and fails together with --workers"""
+        from sqlalchemy import func, select
+        from src.storage.database import Database
+        from src.storage.models import Transaction
+
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "data").mkdir()
+        main.init_db()
+        incoming = tmp_path / "incoming"
+        incoming.mkdir()
+        for name, agent in (("east.csv", "A001"), ("west.csv", "A002")):
+            (incoming / name).write_text("agent_id,retailer_id,transaction_amount,date\n"
+                                         f"{agent},R001,100.0,2024-01-15\n{agent},R002,200.0,2024-01-20\n")
+
+        with pytest.raises(SystemExit):
+            main.main(["load", "--file", str(incoming), "--chunksize", "1", "--workers", "2"])
+        main.main(["load", "--file", str(incoming), "--chunksize", "1", "--metrics-report", ""])
+
+        db = Database()
+        assert db.session.scalar(select(func.count()).select_from(Transaction)) == 4
+        db.close()
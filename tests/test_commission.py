@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import pandas as pd
+from datetime import date
+from src.processing.commission import CommissionPlan, CommissionRules
+
+
+TIERS = [
+    {"min_sales": 0, "rate": 0.05},
+    {"min_sales": 5000, "rate": 0.08},
+    {"min_sales": 10000, "rate": 0.10}
+]
+
+
+class TestCommissionRules:
+    """Tests for the tiered commission engine"""
+
+    def test_default_matches_legacy_rule(self):
+        """Test default plan pays 5% below 5000 and 8% from 5000"""
+        agent_sales = pd.DataFrame({"agent_id": ["A001", "A002", "A003"], "total_sales": [4999.99, 5000.0, 6000.0]})
+        result = CommissionRules.default().apply(agent_sales)
+
+        assert result["commission_rate"].tolist() == [0.05, 0.08, 0.08]
+        assert result["commission_amount"].tolist()[2] == 480.0
+
+    def test_marginal_tiers(self):
+        """Test marginal plan applies each rate only to the sales inside its tier"""
+        plan = CommissionPlan("marginal", TIERS, mode="marginal")
+        rate, amount = plan.evaluate(np.array([4000.0, 12000.0, 0.0]))
+
+        # 12000: 5000 * 5% + 5000 * 8% + 2000 * 10% = 250 + 400 + 200
+        assert amount.tolist() == [200.0, 850.0, 0.0]
+        assert rate[1] == 850.0 / 12000.0
+
+    def test_region_and_period_plans(self, tmp_path):
+        """Test plans are selected by region first and by validity period"""
+        config = {"plans": [
+            {"name": "west-2024", "region": "west", "valid_from": "2024-01-01", "valid_to": "2024-12-31",
+             "tiers": [{"min_sales": 0, "rate": 0.10}]},
+            {"name": "standard", "tiers": [{"min_sales": 0, "rate": 0.05}]}
+        ]}
+        path = tmp_path / "plans.json"
+        path.write_text(json.dumps(config))
+        rules = CommissionRules.load(str(path))
+
+        agent_sales = pd.DataFrame({"agent_id": ["A001", "A002"], "total_sales": [100.0, 100.0],
+                                    "region": ["west", "east"]})
+        in_period = rules.apply(agent_sales, as_of=date(2024, 6, 1))
+        after_period = rules.apply(agent_sales, as_of=date(2025, 6, 1))
+
+        assert in_period["commission_rate"].tolist() == [0.10, 0.05]
+        assert after_period["commission_rate"].tolist() == [0.05, 0.05]
@@ -0,0 +1,225 @@
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, inspect, select, text
+from src.ingestion.reader import compact
+from src.processing.commission import CommissionPlan, CommissionRules
+from src.storage.database import Database
+from src.storage.models import Agent, Retailer, Transaction, Commission, MonthlySales, RetailerSales, AgentMonthlySales
+
+
+class TestDatabase:
+    """Tests for Database class"""
+
+    @pytest.fixture
+    def db(self):
+        """Create an in-memory database for testing"""
+        database = Database("sqlite://", init_schema=True)
+        yield database
+        database.close()
+
+    @pytest.fixture
+    def sample_data(self):
+        """Create sample transaction data for testing"""
+        return pd.DataFrame({
+            "agent_id": ["A001", "A001", "A002"],
+            "retailer_id": ["R001", "R002", "R001"],
+            "transaction_amount": [1500.0, 2500.0, 3000.0],
+            "date": ["2024-01-15", "2024-01-20", "2024-02-10"]
+        })
+
+    def test_bulk_save_matches_orm_save(self, db, sample_data):
+        """Test bulk insert path stores the same rows as the ORM path"""
+        db.save_agents(sample_data)
+        db.save_retailers(sample_data)
+        db.save_transactions_bulk(sample_data, batch_size=2)
+
+        rows = db.session.query(Transaction).order_by(Transaction.id).all()
+        assert len(rows) == 3
+        assert [r.transaction_amount for r in rows] == [1500.0, 2500.0, 3000.0]
+        assert str(rows[2].date) == "2024-02-10"
+
+    def test_save_all_orm_path(self, db, sample_data):
+        """Test save_all still supports the per-row ORM path"""
+        commissions = pd.DataFrame({
+            "agent_id": ["A001", "A002"],
+            "total_sales": [4000.0, 3000.0],
+            "commission_rate": [0.05, 0.05],
+            "commission_amount": [200.0, 150.0]
+        })
+        db.save_all(sample_data, commissions, bulk=False)
+
+        assert db.session.query(Transaction).count() == 3
+        assert db.session.query(Agent).count() == 2
+        assert db.session.query(Retailer).count() == 2
+
+    def test_save_agents_skips_existing_keys(self, db, sample_data):
+        """Test dimension loader inserts only new agents and retailers on rerun"""
+        db.save_agents(sample_data)
+        db.save_retailers(sample_data)
+
+        more = pd.DataFrame({"agent_id": ["A002", "A003"], "retailer_id": ["R001", "R003"]})
+        db.save_agents(more)
+        db.save_retailers(more)
+
+        agents = sorted(a.agent_id for a in db.session.query(Agent).all())
+        retailers = sorted(r.retailer_id for r in db.session.query(Retailer).all())
+        assert agents == ["A001", "A002", "A003"]
+        assert retailers == ["R001", "R002", "R003"]
+
+    def test_save_agents_fallback_without_on_conflict(self, db, sample_data, monkeypatch):
+        """Test dimension loader falls back to a single existing-keys query"""
+        monkeypatch.setattr(db, "_dialect_insert", lambda table: None)
+        db.save_agents(sample_data)
+        db.save_agents(sample_data)
+
+        assert db.session.query(Agent).count() == 2
+
+    def test_watermark_roundtrip(self, db):
+        """Test ingestion ledger records the offset and accumulates loaded rows"""
+        assert db.get_watermark("data/new.csv") == (0, None)
+
+        db.record_watermark("data/new.csv", 100, "abc", 3)
+        db.record_watermark("data/new.csv", 250, "def", 2)
+
+        assert db.get_watermark("data/new.csv") == (250, "def")
+
+    def test_save_commissions_without_replace_keeps_other_agents(self, db, sample_data):
+        """Test incremental commission save only overwrites agents in the delta"""
+        db.save_agents(sample_data)
+        commissions = pd.DataFrame({
+            "agent_id": ["A001", "A002"],
+            "total_sales": [4000.0, 3000.0],
+            "commission_rate": [0.05, 0.05],
+            "commission_amount": [200.0, 150.0]
+        })
+        db.save_commissions(commissions)
+
+        update = commissions.iloc[[0]].assign(total_sales=6000.0, commission_rate=0.08, commission_amount=480.0)
+        db.save_commissions(update, replace=False)
+
+        totals = db.get_agent_totals(["A001", "A002"]).set_index("agent_id")["total_sales"]
+        assert totals.to_dict() == {"A001": 6000.0, "A002": 3000.0}
+
+    def test_rollups_accumulate_across_batches(self, db, sample_data):
+        """Test rollups add each batch's totals and match a full rebuild"""
+        db.save_batch(sample_data.iloc[:2])
+        db.save_batch(sample_data.iloc[2:])
+        db.save_batch(sample_data.iloc[:1])
+
+        def snapshot():
+            return {
+                "monthly": sorted((m.month, m.total_sales) for m in db.session.query(MonthlySales)),
+                "retailer": sorted((r.retailer_id, r.total_sales) for r in db.session.query(RetailerSales)),
+                "agent_month": sorted((a.agent_id, a.month, a.total_sales) for a in db.session.query(AgentMonthlySales)),
+            }
+
+        incremental = snapshot()
+        assert incremental["monthly"] == [("2024-01", 5500.0), ("2024-02", 3000.0)]
+        assert incremental["retailer"] == [("R001", 6000.0), ("R002", 2500.0)]
+
+        db.rebuild_rollups()
+        assert snapshot() == incremental
+
+    def test_rollups_skip_unobserved_categories(self, db, sample_data):
+        """Test a compact batch whose categoricals list absent IDs adds no zero-sum rollup rows"""
+        batch = compact(sample_data.assign(date=pd.to_datetime(sample_data["date"]))).iloc[[0]]
+        db.save_batch(batch)
+
+        assert [(a.agent_id, a.month) for a in db.session.query(AgentMonthlySales)] == [("A001", "2024-01")]
+        assert [r.retailer_id for r in db.session.query(RetailerSales)] == ["R001"]
+
+    def test_rollups_fallback_without_on_conflict(self, db, sample_data, monkeypatch):
+        """Test rollup increments work on dialects without ON CONFLICT support"""
+        monkeypatch.setattr(db, "_dialect_insert", lambda table: None)
+        db.save_batch(sample_data)
+        db.save_batch(sample_data.iloc[:1])
+
+        assert db.session.get(RetailerSales, "R001").total_sales == 6000.0
+        assert db.session.get(MonthlySales, "2024-02").total_sales == 3000.0
+
+    def test_init_schema_drops_superseded_indexes(self, tmp_path):
+        """Test re-running init_schema on an older database removes the index names the new ones replaced"""
+        db_url = f"sqlite:///{tmp_path / 'old.db'}"
+        Database(db_url, init_schema=True).close()
+        database = Database(db_url)
+        with database.engine.begin() as connection:
+            connection.execute(text("CREATE INDEX ix_transactions_agent_amount ON transactions (agent_id, transaction_amount)"))
+
+        database.init_schema()
+        names = {index["name"] for index in inspect(database.engine).get_indexes("transactions")}
+        database.close()
+
+        assert "ix_transactions_agent_amount" not in names
+        assert "ix_transactions_agent_date_amount" in names
+
+    def test_init_schema_adds_source_column_to_older_databases(self, tmp_path):
+        """Test a transactions table without source_id is refused until init_schema adds the column"""
+        db_url = f"sqlite:///{tmp_path / 'old.db'}"
+        Database(db_url, init_schema=True).close()
+        engine = create_engine(db_url)
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE transactions"))
+            connection.execute(text("CREATE TABLE transactions (id INTEGER PRIMARY KEY, agent_id VARCHAR NOT NULL, "
+                                    "retailer_id VARCHAR NOT NULL, transaction_amount FLOAT NOT NULL, date DATE NOT NULL)"))
+        engine.dispose()
+
+        with pytest.raises(RuntimeError, match="source_id"):
+            Database(db_url)
+        Database(db_url, init_schema=True).close()
+        database = Database(db_url)
+        assert "source_id" in {column["name"] for column in inspect(database.engine).get_columns("transactions")}
+        database.close()
+
+    def test_schema_is_created_only_by_init_schema(self, tmp_path):
+        """Test opening an uninitialized database fails with a hint, and works after init_schema"""
+        db_url = f"sqlite:///{tmp_path / 'new.db'}"
+        with pytest.raises(RuntimeError, match="init-db"):
+            Database(db_url)
+
+        Database(db_url, init_schema=True).close()
+        database = Database(db_url)
+        assert database.get_watermark("data/transactions.csv") == (0, None)
+        database.close()
+
+    def test_refresh_commissions_matches_pandas_engine(self, db, sample_data):
+        """Test the SQL CASE refresh gives the same commissions as CommissionRules for flat and marginal plans"""
+        tiers = [{"min_sales": 0, "rate": 0.05}, {"min_sales": 3000, "rate": 0.08}, {"min_sales": 3500, "rate": 0.10}]
+        db.save_batch(sample_data)
+        totals = pd.DataFrame({"agent_id": ["A001", "A002"], "total_sales": [4000.0, 3000.0]})
+
+        for mode in ("flat", "marginal"):
+            rules = CommissionRules([CommissionPlan(mode, tiers, mode=mode)])
+            db.save_commissions(pd.DataFrame({"agent_id": ["A009"], "total_sales": [1.0], "commission_rate": [0.0],
+                                              "commission_amount": [0.0]}))
+            assert db.refresh_commissions(rules) == 2
+
+            stored = pd.read_sql(select(Commission).order_by(Commission.agent_id), db.engine)
+            expected = rules.apply(totals)
+            assert stored["agent_id"].tolist() == ["A001", "A002"]
+            assert stored["commission_amount"].tolist() == pytest.approx(expected["commission_amount"].tolist())
+            assert stored["commission_rate"].tolist() == pytest.approx(expected["commission_rate"].tolist())
+
+    def test_failed_save_all_leaves_no_partial_rows(self, db, sample_data, monkeypatch):
+        """Test save_all is one transaction: an error in a late step rolls back the earlier inserts"""
+        def fail(*args, **kwargs):
+            raise RuntimeError("rollup failure")
+        monkeypatch.setattr(db, "save_rollups", fail)
+
+        with pytest.raises(RuntimeError):
+            db.save_all(sample_data)
+
+        assert db.session.query(Transaction).count() == 0
+        assert db.session.query(Agent).count() == 0
+
+    def test_tuned_sqlite_profile_sets_pragmas(self, tmp_path):
+        """Test the tuned profile switches SQLite to WAL with relaxed sync on every connection"""
+        database = Database(f"sqlite:///{tmp_path / 'tuned.db'}", init_schema=True, sqlite_profile="tuned")
+        pragma = lambda name: database.session.execute(text(f"PRAGMA {name}")).scalar()
+
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1
+        assert pragma("temp_store") == 2
+        database.close()
+
+        with pytest.raises(ValueError):
+            Database(f"sqlite:///{tmp_path / 'tuned.db'}", sqlite_profile="fastest")
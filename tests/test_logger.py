@@ -0,0 +1,87 @@
+import json
+import logging
+import multiprocessing
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+from src.utils import logger as logger_module
+from src.utils.logger import configure_logging, init_worker_logging, setup_logger, shutdown_logging
+
+
+def log_in_worker(name: str, message: str):
+    logging.getLogger(name).info(message)
+
+
+@pytest.fixture(autouse=True)
+def restore_options():
+    """Reset logging options and stop background writers after each test"""
+    saved = dict(logger_module._options)
+    yield
+    shutdown_logging()
+    logger_module._options.clear()
+    logger_module._options.update(saved)
+
+
+class TestLogger:
+    """Tests for queue-based, JSON and sampled logging"""
+
+    def test_async_writes_after_shutdown(self, tmp_path):
+        """Test async loggers share one background writer and all records are flushed on shutdown"""
+        log_file = str(tmp_path / "logs" / "async.log")
+        configure_logging(async_mode=True)
+        first = setup_logger("test_async_first", log_file)
+        second = setup_logger("test_async_second", log_file)
+
+        assert isinstance(first.handlers[0], logging.handlers.QueueHandler)
+        assert first.handlers == second.handlers
+
+        for i in range(1000):
+            first.info(f"record {i}")
+        shutdown_logging()
+
+        assert len(open(log_file).read().splitlines()) == 1000
+
+        # After shutdown the logger keeps working synchronously
+        first.info("after shutdown")
+        assert open(log_file).read().splitlines()[-1].endswith("after shutdown")
+
+    @pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs the fork start method")
+    def test_pool_workers_log_synchronously(self, tmp_path):
+        """Test records logged by forked pool workers reach the file, not an undrained inherited queue"""
+        log_file = str(tmp_path / "logs" / "workers.log")
+        configure_logging(async_mode=True)
+        setup_logger("test_async_workers", log_file)
+
+        # Workers must inherit the handlers set up above, which only fork does
+        with ProcessPoolExecutor(max_workers=2, initializer=init_worker_logging,
+                                 mp_context=multiprocessing.get_context("fork")) as pool:
+            list(pool.map(log_in_worker, ["test_async_workers"] * 4, [f"worker {i}" for i in range(4)]))
+        shutdown_logging()
+
+        assert sorted(line.split(" - ")[-1] for line in open(log_file).read().splitlines()) == [
+            f"worker {i}" for i in range(4)
+        ]
+
+    def test_json_format(self, tmp_path):
+        """Test JSON mode writes one parseable object per record"""
+        log_file = str(tmp_path / "json.log")
+        configure_logging(json_format=True)
+        logger = setup_logger("test_json", log_file)
+        logger.warning("5 rows rejected")
+
+        entry = json.loads(open(log_file).read())
+        assert entry["level"] == "WARNING"
+        assert entry["logger"] == "test_json"
+        assert entry["message"] == "5 rows rejected"
+
+    def test_sampling_only_affects_configured_level(self, tmp_path):
+        """Test sampling keeps one of every N warnings and every other record"""
+        log_file = str(tmp_path / "sampled.log")
+        configure_logging(sample_every={"WARNING": 10})
+        logger = setup_logger("test_sampled", log_file)
+        for _ in range(100):
+            logger.warning("noisy")
+            logger.info("kept")
+
+        lines = open(log_file).read().splitlines()
+        assert sum("noisy" in line for line in lines) == 10
+        assert sum("kept" in line for line in lines) == 100
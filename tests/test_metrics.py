@@ -0,0 +1,60 @@
+import json
+import pandas as pd
+import pytest
+from src.processing.aggregator import DataAggregator
+from src.utils.metrics import instrument, metrics, timed
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    """Start each test with an empty registry"""
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestMetrics:
+    """Tests for stage timers and run reports"""
+
+    def test_timed_records_rows_and_rate(self):
+        """Test timed() accumulates calls, seconds and rows per stage"""
+        for _ in range(2):
+            with timed("stage", rows=500) as timer:
+                pass
+        stage = metrics.report()["stages"]["stage"]
+
+        assert stage["calls"] == 2
+        assert stage["rows"] == 1000
+        assert stage["seconds"] >= timer.seconds > 0
+        assert stage["rows_per_sec"] == 1000 / stage["seconds"]
+
+    def test_instrument_counts_dataframe_rows_and_failures(self):
+        """Test instrument() takes rows from the DataFrame argument and still records calls that raise"""
+        @instrument("save")
+        def save(df):
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            save(pd.DataFrame({"a": [1, 2, 3]}))
+        assert metrics.report()["stages"]["save"]["rows"] == 3
+
+    def test_aggregator_stage_and_report(self, tmp_path):
+        """Test aggregation is timed once per frame and the run report is written as JSON"""
+        df = pd.DataFrame({
+            "agent_id": ["A001", "A002"],
+            "retailer_id": ["R001", "R001"],
+            "transaction_amount": [100.0, 50.0],
+            "date": ["2024-01-15", "2024-02-15"],
+        })
+        aggregator = DataAggregator(df)
+        aggregator.sales_by_agent()
+        aggregator.monthly_totals()
+
+        path = tmp_path / "run_metrics.json"
+        metrics.write_report(str(path), status="succeeded")
+        report = json.loads(path.read_text())
+
+        assert report["status"] == "succeeded"
+        assert report["stages"]["aggregation.totals"]["calls"] == 1
+        assert report["stages"]["aggregation.totals"]["rows"] == 2
+        assert "pipeline_stage_rows_total{stage=\"aggregation.totals\"} 2" in metrics.to_prometheus()
@@ -2,6 +2,7 @@ import pytest
 import pandas as pd
 import os
 import tempfile
+from src.ingestion.columnar import read_staged, stage_batch
 from src.ingestion.reader import DataReader
 
 
@@ -94,3 +95,159 @@ A002,R002,2000.00,2024-01-17"""
 
         assert len(valid_data) == 2
         assert valid_data["transaction_amount"].dtype == float
+
+    def test_iter_chunks_bounds_batch_size(self, tmp_path):
+        """Test streaming read yields chunks of at most chunksize rows"""
+        csv_content = """agent_id,retailer_id,transaction_amount,date
+A001,R001,1500.00,2024-01-15
+A002,R002,2000.00,2024-01-16
+A003,R003,2500.00,2024-01-17"""
+
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text(csv_content)
+
+        reader = DataReader(str(csv_file))
+        chunks = list(reader.iter_chunks(chunksize=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+
+    def test_ingest_stream_yields_valid_batches(self, tmp_path):
+        """Test streaming ingest validates each batch and drops invalid rows"""
+        csv_content = """agent_id,retailer_id,transaction_amount,date
+A001,R001,1500.00,2024-01-15
+A002,R002,invalid,2024-01-16
+,R001,500.00,2024-01-16
+A003,R003,2500.00,2024-01-17"""
+
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text(csv_content)
+
+        reader = DataReader(str(csv_file))
+        batches = list(reader.ingest_stream(chunksize=2))
+
+        assert len(batches) == 2
+        assert sum(len(batch) for batch in batches) == 2
+        assert list(pd.concat(batches)["agent_id"]) == ["A001", "A003"]
+
+    def test_read_from_offset_only_returns_appended_rows(self, tmp_path):
+        """Test reading from a byte offset keeps the header and skips ingested rows"""
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text("agent_id,retailer_id,transaction_amount,date\nA001,R001,1500.00,2024-01-15\n")
+        offset = csv_file.stat().st_size
+        with open(csv_file, "a") as f:
+            f.write("A002,R002,2000.00,2024-01-16\n")
+
+        reader = DataReader(str(csv_file), start_offset=offset)
+        df = reader.read_csv()
+
+        assert list(df.columns) == ["agent_id", "retailer_id", "transaction_amount", "date"]
+        assert list(df["agent_id"]) == ["A002"]
+        assert reader.content_hash(offset) == DataReader(str(csv_file)).content_hash(offset)
+
+    def test_validate_parses_dates_once(self, tmp_path):
+        """Test valid rows carry parsed dates and unparseable dates are rejected"""
+        csv_content = """agent_id,retailer_id,transaction_amount,date
+A001,R001,1500.00,2024-01-15
+A002,R002,2000.00,not-a-date"""
+
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text(csv_content)
+
+        reader = DataReader(str(csv_file))
+        valid_df, invalid_df = reader.validate(reader.read_csv())
+
+        assert len(valid_df) == 1
+        assert len(invalid_df) == 1
+        assert pd.api.types.is_datetime64_any_dtype(valid_df["date"])
+
+    def test_ingest_emits_compact_schema(self, tmp_path):
+        """Test valid rows use categorical IDs, second-resolution dates and optional cents"""
+        csv_content = """agent_id,retailer_id,transaction_amount,date
+A001,R001,0.10,2024-01-15
+A001,R002,0.20,2024-01-16"""
+
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text(csv_content)
+
+        valid_data = DataReader(str(csv_file)).ingest()
+        assert isinstance(valid_data["agent_id"].dtype, pd.CategoricalDtype)
+        assert valid_data["date"].dtype == "datetime64[s]"
+
+        cents = DataReader(str(csv_file), amounts_in_cents=True).ingest()
+        assert cents["amount_cents"].tolist() == [10, 20]
+        assert "transaction_amount" not in cents.columns
+
+    def test_ingest_parquet_and_feather(self, tmp_path):
+        """Test columnar inputs are read by extension and validated like CSV"""
+        pytest.importorskip("pyarrow")
+        df = pd.DataFrame({
+            "agent_id": ["A001", None],
+            "retailer_id": ["R001", "R002"],
+            "transaction_amount": [1500.0, 2000.0],
+            "date": ["2024-01-15", "2024-01-16"]
+        })
+        df.to_parquet(tmp_path / "test.parquet")
+        df.to_feather(tmp_path / "test.feather")
+
+        for name in ["test.parquet", "test.feather"]:
+            reader = DataReader(str(tmp_path / name))
+            assert reader.ingest()["agent_id"].tolist() == ["A001"]
+            assert sum(len(b) for b in reader.ingest_stream(chunksize=1)) == 1
+
+    def test_columnar_stream_reads_input_columns_and_numbers_rows(self, tmp_path):
+        """Test columnar chunks hold only the input columns and rejects keep their row in the file"""
+        pytest.importorskip("pyarrow")
+        df = pd.DataFrame({
+            "agent_id": ["A001", "A002", "A003", None, "A005"],
+            "retailer_id": ["R001", "R002", "R003", "R004", "R005"],
+            "transaction_amount": [1500.0, 2000.0, 2500.0, 3000.0, 3500.0],
+            "date": ["2024-01-15", "2024-01-16", "2024-01-17", "2024-01-18", "2024-01-19"],
+            "notes": ["unused"] * 5
+        })
+        df.to_parquet(tmp_path / "test.parquet", row_group_size=2)
+        df.to_feather(tmp_path / "test.feather")
+
+        for name in ["test.parquet", "test.feather"]:
+            rejects_path = tmp_path / f"{name}.rejects.jsonl"
+            reader = DataReader(str(tmp_path / name), rejects_path=str(rejects_path))
+            chunks = list(reader.iter_chunks(chunksize=2))
+            assert [len(c) for c in chunks] == [2, 2, 1]
+            assert all("notes" not in c.columns for c in chunks)
+            assert "notes" not in reader.read().columns
+
+            assert sum(len(b) for b in reader.ingest_stream(chunksize=2)) == 4
+            assert pd.read_json(rejects_path, lines=True)["source_row"].tolist() == [3]
+
+    def test_stage_and_read_partitions(self, tmp_path):
+        """Test staged batches are partitioned by month and read back by partition"""
+        pytest.importorskip("pyarrow")
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text("""agent_id,retailer_id,transaction_amount,date
+A001,R001,1500.00,2024-01-15
+A002,R002,2000.00,2024-02-16""")
+        stage_batch(DataReader(str(csv_file)).ingest(), str(tmp_path / "staged"))
+
+        assert sorted(p.name for p in (tmp_path / "staged").iterdir()) == ["month=2024-01", "month=2024-02"]
+        february = read_staged(str(tmp_path / "staged"), columns=["agent_id", "transaction_amount"], months=["2024-02"])
+        assert february["agent_id"].tolist() == ["A002"]
+        assert list(february.columns) == ["agent_id", "transaction_amount"]
+
+    def test_rejected_rows_go_to_sink_with_reasons(self, tmp_path):
+        """Test invalid rows are written in bulk to the rejects sink with a reason code"""
+        csv_content = """agent_id,retailer_id,transaction_amount,date
+A001,R001,1500.00,2024-01-15
+,R001,500.00,2024-01-16
+A002,R002,invalid,2024-01-17
+A003,R003,,2024-01-18
+A004,R004,10.00,not-a-date"""
+
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text(csv_content)
+        rejects_path = tmp_path / "rejected.jsonl"
+
+        reader = DataReader(str(csv_file), rejects_path=str(rejects_path))
+        reader.ingest()
+
+        rejects = pd.read_json(rejects_path, lines=True)
+        assert rejects["reject_reason"].tolist() == ["missing_agent_id", "invalid_amount", "missing_amount", "invalid_date"]
+        assert rejects["source_row"].tolist() == [1, 2, 3, 4]
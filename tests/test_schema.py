@@ -0,0 +1,83 @@
+import json
+import pytest
+import pandas as pd
+from src.ingestion.reader import DataReader
+from src.ingestion.schema import ColumnRule, Schema, to_number
+
+
+def raw_frame(rows):
+    return pd.DataFrame(rows, columns=["agent_id", "retailer_id", "transaction_amount", "date"])
+
+
+class TestSchema:
+    """Tests for the declarative validation schema"""
+
+    def test_default_rules_reject_format_range_and_parse_failures(self):
+        """Test each default rule rejects its rows with the first reason in column order"""
+        df = raw_frame([
+            ["A001", "R001", "10.50", "2024-01-15"],
+            ["X001", "R001", "10.50", "2024-01-15"],
+            ["A001", "R001", "-5", "2024-01-15"],
+            ["A001", "R001", "0", "2024-02-30"],
+            ["A001", None, "abc", "not-a-date"],
+        ])
+
+        parsed, reasons, counts = Schema.default().evaluate(df)
+
+        assert reasons.tolist() == ["", "invalid_agent_id_format", "amount_out_of_range",
+                                    "amount_out_of_range", "missing_retailer_id"]
+        assert counts["amount_out_of_range"] == 2
+        assert counts["invalid_amount"] == 1
+        assert counts["invalid_date"] == 2
+        assert parsed["transaction_amount"].iloc[0] == 10.5
+
+    def test_missing_column_raises(self):
+        """Test a frame without a required column is rejected outright"""
+        df = pd.DataFrame({"agent_id": ["A001"], "retailer_id": ["R001"], "transaction_amount": ["1"]})
+
+        with pytest.raises(ValueError, match="date"):
+            Schema.default().evaluate(df)
+
+    def test_arrow_number_parsing_matches_pandas(self):
+        """Test the Arrow fast path parses the same numbers as pd.to_numeric"""
+        values = pd.Series([" 12.5", "1e3", "-3", ".5", "abc", "1,000", None], dtype="str")
+
+        expected = pd.to_numeric(values.astype(object), errors="coerce")
+
+        pd.testing.assert_series_equal(to_number(values), expected, check_dtype=False)
+
+    def test_reader_uses_schema_from_config_and_counts_rules(self, tmp_path):
+        """Test DataReader validates with a schema loaded from JSON and accumulates per-rule counts"""
+        config = tmp_path / "schema.json"
+        config.write_text(json.dumps({"columns": [
+            {"name": "agent_id"},
+            {"name": "retailer_id"},
+            {"name": "transaction_amount", "dtype": "number", "label": "amount", "max_value": 1000},
+            {"name": "date", "dtype": "date", "min_value": "2024-01-01"},
+        ]}))
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text("""agent_id,retailer_id,transaction_amount,date
+anyone,R001,500.00,2024-01-15
+A002,R002,5000.00,2024-01-16
+A003,R003,10.00,2023-12-31""")
+
+        reader = DataReader(str(csv_file), schema=Schema.load(str(config)))
+        valid_df, invalid_df = reader.validate(reader.read_csv())
+
+        assert valid_df["agent_id"].tolist() == ["anyone"]
+        assert invalid_df["reject_reason"].tolist() == ["amount_out_of_range", "date_out_of_range"]
+        assert reader.rule_counts["amount_out_of_range"] == 1
+        assert reader.rule_counts["date_out_of_range"] == 1
+
+    def test_date_rule_with_only_max_value(self):
+        """Test a range with just an upper bound rejects later dates and leaves missing ones to the required check"""
+        rule = ColumnRule("date", "date", max_value="2024-12-31")
+        values = pd.Series(["2024-06-01", "2025-01-01", None])
+        checks = rule.checks(values, rule.parse(values))
+
+        assert checks["date_out_of_range"].tolist() == [False, True, False]
+
+    def test_unknown_column_type_raises(self):
+        """Test a schema rule with an unsupported type is rejected"""
+        with pytest.raises(ValueError):
+            ColumnRule("agent_id", "uuid")